@@ -0,0 +1,352 @@
+"""This program measures how long the data layer of My Library Manager takes on large catalogs, without
+launching the GUI.
+
+It generates synthetic catalogs in the format of the GoodReads data files, at any number of books, then times
+loading them, building the tree, filtering and sorting them in every sort mode, sorting them by similarity to
+saved libraries of growing sizes, and searching titles. The timings are written as JSON, so that the results
+of two commits can be compared with --compare.
+
+Run it as a script, for example:
+    python benchmark.py --books 10000 100000 --output bench.json
+    python benchmark.py --books 10000 --output new.json --compare bench.json
+"""
+from __future__ import annotations
+import os
+import gc
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import statistics
+import subprocess
+from itertools import accumulate
+from datetime import datetime, timezone
+from typing import Any, Callable, Optional
+import my_library_manager_data as data
+from similarity import SimilarityEngine
+from search_index import SearchIndex
+from fuzzy_index import TrigramIndex
+
+# The version of the format of the JSON output
+RESULTS_VERSION = 1
+
+# The genres of the GoodReads genre file, from most to least common, and how common each one is
+GENRES = {"fiction": 40, "romance": 18, "fantasy, paranormal": 16, "mystery, thriller, crime": 14,
+          "history, historical fiction, biography": 14, "non-fiction": 12, "young-adult": 9, "children": 7,
+          "comics, graphic": 5, "poetry": 3}
+
+# Shelves that almost every book is on, with the fraction of books on each one. Other shelves are drawn from
+# a long tail of SHELF_TAIL shelves, whose popularity follows Zipf's law
+COMMON_SHELVES = {"to-read": 0.97, "currently-reading": 0.7, "favorites": 0.55, "owned": 0.45, "fiction": 0.4,
+                  "books-i-own": 0.35, "kindle": 0.3, "library": 0.25, "default": 0.2, "book-club": 0.12}
+SHELF_TAIL = 20_000
+MAX_SHELVES = 100
+
+# The words that titles are made of, whose frequency follows Zipf's law like the words of real titles
+TITLE_WORDS = 5_000
+
+# The fraction of books missing each field that can be missing. Like in the GoodReads data, every book has
+# an average rating, which load_tree relies on
+MISSING_RATE = {'isbn': 0.15, 'num_pages': 0.2, 'publication_year': 0.15, 'genres': 0.08}
+
+# The number of books shown at a time by the results of the Apply button, as in main_frame2.py
+PAGE_SIZE = 40
+
+SORT_MODES = ("Similarity (decreasing)",) + data.SORT_MODES
+
+
+def generate_catalog(directory: str, n_books: int, seed: int = 0) -> tuple[str, str, str]:
+    """Write a synthetic catalog of n_books books to directory, in the format of the GoodReads genres,
+    authors and books data files, and return the paths of these three files.
+    The catalog only depends on n_books and seed, and files already written for them are reused.
+
+    Preconditions:
+        - n_books >= 1
+    """
+    os.makedirs(directory, exist_ok=True)
+    prefix = os.path.join(directory, f'synthetic_{n_books}_{seed}')
+    genres_file, authors_file, books_file = (f'{prefix}_genres.json', f'{prefix}_authors.json',
+                                             f'{prefix}_books.json')
+    if all(os.path.exists(path) for path in (genres_file, authors_file, books_file)):
+        return genres_file, authors_file, books_file
+
+    rng = random.Random(seed)
+    n_authors = max(10, n_books // 5)
+    genres = list(GENRES)
+    genre_weights = list(accumulate(GENRES.values()))
+    shelves = [f'shelf-{i}' for i in range(SHELF_TAIL)]
+    shelf_weights = _zipf_weights(SHELF_TAIL)
+    words = [_word(rng) for _ in range(TITLE_WORDS)]
+    word_weights = _zipf_weights(TITLE_WORDS)
+    author_ids = [str(author_id) for author_id in range(n_authors)]
+    author_weights = _zipf_weights(n_authors)
+
+    with open(authors_file + '.tmp', 'w') as file:
+        for author_id in range(n_authors):
+            file.write(json.dumps({"author_id": str(author_id),
+                                   "name": f"{_word(rng).title()} {_word(rng).title()}"}) + '\n')
+
+    with open(genres_file + '.tmp', 'w') as genre_out, open(books_file + '.tmp', 'w') as book_out:
+        for i in range(n_books):
+            book_id = str(1_000_000 + i)
+            ratings_count = int(rng.paretovariate(1.1)) - 1
+
+            book_genres = {}
+            if rng.random() >= MISSING_RATE['genres']:
+                for genre in set(rng.choices(genres, cum_weights=genre_weights, k=rng.randint(1, 4))):
+                    book_genres[genre] = str(rng.randint(1, 1 + ratings_count))
+            genre_out.write(json.dumps({"book_id": book_id, "genres": book_genres}) + '\n')
+
+            book_shelves = [name for name, rate in COMMON_SHELVES.items() if rng.random() < rate]
+            tail_size = min(MAX_SHELVES - len(book_shelves), int(rng.expovariate(1 / 25)))
+            book_shelves.extend(dict.fromkeys(rng.choices(shelves, cum_weights=shelf_weights, k=tail_size)))
+            popular_shelves = [{"count": str(max(1, ratings_count // (rank + 1))), "name": name}
+                               for rank, name in enumerate(book_shelves)]
+
+            title = ' '.join(rng.choices(words, cum_weights=word_weights, k=rng.randint(1, 6))).title()
+            book_authors = [{"author_id": rng.choices(author_ids, cum_weights=author_weights)[0], "role": ""}]
+            if rng.random() < 0.1:
+                book_authors.append({"author_id": str(rng.randrange(n_authors)), "role": "Translator"})
+
+            book_out.write(json.dumps({
+                "isbn": _maybe(rng, 'isbn', f'{rng.randrange(10 ** 10):010d}'),
+                "popular_shelves": popular_shelves,
+                "average_rating": f'{min(5.0, max(1.0, rng.gauss(3.9, 0.35))):.2f}',
+                "description": ' '.join(rng.choices(words, cum_weights=word_weights, k=int(rng.expovariate(1 / 60)))),
+                "link": f"https://www.goodreads.com/book/show/{book_id}",
+                "authors": book_authors,
+                "num_pages": _maybe(rng, 'num_pages', str(max(1, int(rng.lognormvariate(5.6, 0.5))))),
+                "publication_year": _maybe(rng, 'publication_year', str(2017 - int(rng.expovariate(1 / 15)))),
+                "url": f"https://www.goodreads.com/book/show/{book_id}",
+                "image_url": f"https://images.gr-assets.com/books/{book_id}m/{book_id}.jpg",
+                "book_id": book_id,
+                "ratings_count": str(ratings_count),
+                "title": title,
+                "title_without_series": title}) + '\n')
+
+    # Files are renamed once complete, so an interrupted run never leaves a partial catalog to be reused
+    for path in (authors_file, genres_file, books_file):
+        os.replace(path + '.tmp', path)
+    return genres_file, authors_file, books_file
+
+
+def _zipf_weights(n: int) -> list[float]:
+    """Return the cumulative weights of n items whose frequency follows Zipf's law, for random.choices.
+    """
+    return list(accumulate(1 / rank for rank in range(1, n + 1)))
+
+
+def _word(rng: random.Random) -> str:
+    """Return a random pronounceable word.
+    """
+    return ''.join(rng.choice('bcdfghklmnprstvwz') + rng.choice('aeiou') for _ in range(rng.randint(1, 4)))
+
+
+def _maybe(rng: random.Random, field: str, value: str) -> str:
+    """Return value, or '' (how the data files leave out a field) at the missing rate of field.
+    """
+    return '' if rng.random() < MISSING_RATE[field] else value
+
+
+def measure(function: Callable, *args: Any, repeat: int = 1) -> dict[str, Any]:
+    """Call function(*args) repeat times and return the times each call took, in seconds, with their minimum,
+    median and mean. The garbage collector is paused during each call, like timeit does.
+
+    >>> sorted(measure(sum, [1, 2], repeat=3))
+    ['mean', 'median', 'min', 'runs', 'seconds']
+    """
+    times = []
+    for _ in range(repeat):
+        gc.collect()
+        gc.disable()
+        try:
+            start = time.perf_counter()
+            function(*args)
+            times.append(time.perf_counter() - start)
+        finally:
+            gc.enable()
+    return {'runs': len(times), 'seconds': times, 'min': min(times), 'median': statistics.median(times),
+            'mean': statistics.fmean(times)}
+
+
+def filter_sequences(genres_list: list[str]) -> dict[str, list[int]]:
+    """Return filter sequences for the Tree, from matching every book to matching few books, by name.
+    """
+    def genres(n: int) -> list[int]:
+        """Return the genre part of a filter sequence that selects the first n genres."""
+        return [1 if i < n else 0 for i in range(len(genres_list))]
+
+    return {'none': [0] * 8 + genres(0),
+            'one_genre': [0] * 8 + genres(1),
+            'two_genres': [0] * 8 + genres(2),
+            'rating_length_genre': [0, 0, 0, 1, 0, 0, 1, 0] + genres(1)}
+
+
+def benchmark_catalog(files: tuple[str, str, str], repeat: int = 3, library_sizes: tuple[int, ...] = (1, 10, 100),
+                      n_queries: int = 50, accelerated: bool = True, seed: int = 0) -> dict[str, dict[str, Any]]:
+    """Time the data layer on the catalog in files, the genres, authors and books data files, and return the
+    timings returned by measure by name.
+
+    Loading steps are timed once, and queries repeat times. If accelerated is True, the catalog is set up like
+    gettingdata.py sets it up: sorted with a SortIndex, and scored by a SimilarityEngine. Otherwise every query
+    runs in pure Python.
+    """
+    genres_file, authors_file, books_file = files
+    rng = random.Random(seed)
+    results = {}
+    loaded = {}
+
+    def run(name: str, function: Callable, *args: Any, times: int = repeat) -> None:
+        """Time function(*args) under name, and keep its last result in loaded."""
+        def call() -> None:
+            loaded[name] = function(*args)
+
+        results[name] = measure(call, repeat=times)
+
+    run('get_genres', data.get_genres, genres_file, times=1)
+    genres_list, book_genres = loaded['get_genres']
+    run('load_authors', data.load_authors, authors_file, times=1)
+    run('load_books', data.load_books, book_genres, loaded['load_authors'], books_file, times=1)
+    books = list(loaded['load_books'])
+    run('load_tree', data.load_tree, genres_list, books, times=1)
+    tree = loaded['load_tree']
+    run('load_filter_index', data.load_filter_index, genres_list, books, times=1)
+
+    if accelerated:
+        run('build_sort_index', data.SortIndex, books, times=1)
+        run('build_similarity_engine', SimilarityEngine, books, times=1)
+        data.set_sort_index(loaded['build_sort_index'])
+        data.set_similarity_engine(loaded['build_similarity_engine'])
+    else:
+        data.set_sort_index(None)
+        data.set_similarity_engine(None)
+
+    try:
+        library = rng.sample(books, min(10, len(books)))
+        for filter_name, filter_sequence in filter_sequences(genres_list).items():
+            for sort_by in SORT_MODES:
+                run(f'get_books_filter_sort[{filter_name}][{sort_by}]', tree.get_books_filter_sort,
+                    filter_sequence, sort_by, library)
+                run(f'first_page[{filter_name}][{sort_by}]',
+                    lambda s, b: tree.get_books_pages(s, b, library).page(0, PAGE_SIZE), filter_sequence, sort_by)
+
+        for size in library_sizes:
+            library = rng.sample(books, min(size, len(books)))
+            run(f'sort_by_similarity[library={size}]', lambda: data.sort_by_similarity(list(books), library))
+    finally:
+        data.set_sort_index(None)
+        data.set_similarity_engine(None)
+
+    run('build_search_index', SearchIndex, books, times=1)
+    run('build_fuzzy_index', TrigramIndex, books, times=1)
+    search_index, fuzzy_index = loaded['build_search_index'], loaded['build_fuzzy_index']
+    queries = [rng.choice(rng.choice(books).title.split()).lower() for _ in range(n_queries)]
+    typos = [_typo(rng, query) for query in queries]
+    run(f'title_scan[{n_queries} queries]',
+        lambda: [[book for book in books if query in book.title.lower()] for query in queries])
+    run(f'search_index[{n_queries} queries]', lambda: [search_index.search(query) for query in queries])
+    run(f'fuzzy_search[{n_queries} queries]', lambda: [fuzzy_index.search(query) for query in typos])
+
+    return results
+
+
+def _typo(rng: random.Random, word: str) -> str:
+    """Return word with one letter replaced, like a mistyped search.
+    """
+    if not word:
+        return word
+    i = rng.randrange(len(word))
+    return word[:i] + rng.choice('abcdefghijklmnopqrstuvwxyz') + word[i + 1:]
+
+
+def run_benchmarks(book_counts: list[int], directory: str, seed: int = 0, **options: Any) -> dict[str, Any]:
+    """Generate a catalog of each number of books in book_counts in directory, benchmark each one with
+    benchmark_catalog and the given options, and return the results with a description of the run.
+    """
+    catalogs = []
+    for n_books in book_counts:
+        start = time.perf_counter()
+        files = generate_catalog(directory, n_books, seed)
+        print(f"{n_books:,} books: catalog ready in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+        results = benchmark_catalog(files, seed=seed, **options)
+        catalogs.append({'books': n_books, 'results': results})
+        print(f"{n_books:,} books: benchmarked", file=sys.stderr)
+
+    return {'version': RESULTS_VERSION, 'created': datetime.now(timezone.utc).isoformat(), 'commit': _git_commit(),
+            'python': platform.python_version(), 'platform': platform.platform(), 'seed': seed,
+            'options': options, 'catalogs': catalogs}
+
+
+def _git_commit() -> Optional[str]:
+    """Return the commit of the working tree, or None if it is not in a git repository.
+    """
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare_results(base: dict[str, Any], new: dict[str, Any]) -> list[tuple[int, str, float, float]]:
+    """Return (number of books, benchmark name, base median, new median) for every benchmark in both base
+    and new, two results returned by run_benchmarks, from the largest slowdown to the largest speedup.
+    """
+    base_catalogs = {catalog['books']: catalog['results'] for catalog in base['catalogs']}
+    rows = []
+    for catalog in new['catalogs']:
+        base_results = base_catalogs.get(catalog['books'], {})
+        for name, timing in catalog['results'].items():
+            if name in base_results:
+                rows.append((catalog['books'], name, base_results[name]['median'], timing['median']))
+    rows.sort(key=lambda row: row[3] / max(row[2], 1e-9), reverse=True)
+    return rows
+
+
+def print_results(results: dict[str, Any]) -> None:
+    """Print the median time of every benchmark in results, returned by run_benchmarks.
+    """
+    for catalog in results['catalogs']:
+        print(f"{catalog['books']:,} books")
+        for name, timing in catalog['results'].items():
+            print(f"  {name:<75} {timing['median'] * 1000:>12,.2f} ms")
+
+
+def print_comparison(rows: list[tuple[int, str, float, float]]) -> None:
+    """Print the rows returned by compare_results.
+    """
+    for n_books, name, base_median, new_median in rows:
+        print(f"{n_books:>10,} {name:<75} {base_median * 1000:>12,.2f} ms -> {new_median * 1000:>12,.2f} ms "
+              f"({new_median / max(base_median, 1e-9):.2f}x)")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark the data layer of My Library Manager on synthetic "
+                                                 "GoodReads catalogs.")
+    parser.add_argument('--books', type=int, nargs='+', default=[10_000],
+                        help="the number of books of each catalog to benchmark (default: 10000)")
+    parser.add_argument('--data-dir', default=os.path.join('data', 'benchmark'),
+                        help="where the synthetic catalogs are written and reused from")
+    parser.add_argument('--seed', type=int, default=0, help="the seed of the synthetic catalogs and queries")
+    parser.add_argument('--repeat', type=int, default=3, help="how many times each query is timed")
+    parser.add_argument('--library-sizes', type=int, nargs='+', default=[1, 10, 100],
+                        help="the sizes of the saved libraries that books are sorted by similarity to")
+    parser.add_argument('--queries', type=int, default=50, help="the number of title searches timed")
+    parser.add_argument('--pure-python', action='store_true',
+                        help="sort without the SortIndex and SimilarityEngine that the application uses")
+    parser.add_argument('--output', help="the file the results are written to as JSON")
+    parser.add_argument('--compare', help="a JSON file of earlier results to compare these results to")
+    arguments = parser.parse_args()
+
+    benchmark_results = run_benchmarks(arguments.books, arguments.data_dir, arguments.seed,
+                                       repeat=arguments.repeat, library_sizes=tuple(arguments.library_sizes),
+                                       n_queries=arguments.queries, accelerated=not arguments.pure_python)
+    if arguments.output:
+        with open(arguments.output, 'w') as output:
+            json.dump(benchmark_results, output, indent=2)
+    print_results(benchmark_results)
+
+    if arguments.compare:
+        with open(arguments.compare) as earlier:
+            print_comparison(compare_results(json.load(earlier), benchmark_results))
@@ -5,36 +5,32 @@ Copyright 2024 Areesha Abidi
 
 import tkinter as tk
 from tkinter import ttk
-from PIL import ImageTk, Image
-import requests
-from io import BytesIO
 import webbrowser
-from PIL.ImageTk import PhotoImage
-from my_library_manager_data import sort_books_by
-from gettingdata import books
+from gettingdata import neighbour_index, similarity_engine, books_to_display
+from saved_books import SavedBooks
+from cover_cache import CoverCache, CoverLoader, pooled_session
+from tracing import traced
 
+# Covers are downloaded once and kept in this directory, deleting the least recently used ones past
+# COVER_CACHE_BYTES
+COVER_CACHE_DIRECTORY = "data/covers"
+COVER_CACHE_BYTES = 64 * 1024 * 1024
+# The number of covers downloaded at the same time
+COVER_WORKERS = 8
 
-class SavedBooks:
-    """Class that will keep the books in saved. Instances will be called on and mutated from different files"""
-    # Instance Attributes:
-    #     - library: set of saved by user books
-    library: list
+# Create the (one and only) cover cache and loader, used by every page that shows covers
+cover_cache = CoverCache(COVER_CACHE_DIRECTORY, COVER_CACHE_BYTES, session=pooled_session(COVER_WORKERS))
+cover_loader = CoverLoader(cover_cache, COVER_WORKERS)
 
-    def __init__(self) -> None:
-        self.library = []
+# The saved books are kept in this file between launches
+SAVED_BOOKS_FILE = "data/saved_books.journal"
 
-    def add_book(self, book):
-        if book not in self.library:
-            self.library.append(book)
-
-    def remove_book(self, book):
-        self.library.remove(book)
-
-
-# Create the (one and only) instance of SavedBooks to store the saved books
-saved_books_library = SavedBooks()
+# Create the (one and only) instance of SavedBooks to store the saved books, with the similarity scores to them
+# kept up to date
+saved_books_library = SavedBooks(similarity_engine.track_library(), SAVED_BOOKS_FILE, books_to_display)
 
 
+@traced()
 def create_book_page(book) -> None:
     root = tk.Toplevel()
     root.title("Book Information Page")
@@ -42,8 +38,8 @@ def create_book_page(book) -> None:
     root.resizable(False, False)  # Make the window unresizable
 
     # Load cover image from URL
-    cover_image = load_cover_image(root, book.image_url, 200, 273)
-    cover_label = ttk.Label(root, image=cover_image)
+    cover_label = ttk.Label(root)
+    load_cover_image(cover_label, book.image_url, 200, 273)
     cover_label.grid(row=0, column=0, rowspan=10, padx=10, pady=10, sticky="nw")
 
     # Display book information
@@ -87,7 +83,7 @@ def create_book_page(book) -> None:
     url_label.bind("<Button-1>", lambda e: webbrowser.open_new(book.book_url))
 
     # Buttons for adding and removing from saved
-    if book not in saved_books_library.library:
+    if book not in saved_books_library:
         add_to_saved_button = ttk.Button(root, text="Add to Saved",
                                          command=lambda: add_to_saved(book, add_to_saved_button))
         add_to_saved_button.grid(row=10, column=1, padx=10, pady=5)
@@ -98,7 +94,7 @@ def create_book_page(book) -> None:
     remove_from_saved_button = ttk.Button(root, text="Remove from Saved",
                                           command=lambda: remove_from_saved(book, add_to_saved_button,
                                                                             remove_from_saved_button))
-    if book in saved_books_library.library:
+    if book in saved_books_library:
         remove_from_saved_button.grid(row=10, column=2, padx=10, pady=5)
 
     # Create frame for Similar Books section
@@ -108,28 +104,23 @@ def create_book_page(book) -> None:
     # Label for Similar Books
     ttk.Label(similar_books_frame, text="Similar Books", font=("Helvetica", 14, "bold")).grid(row=0, column=0,
                                                                                               columnspan=5, pady=5)
-    sort_books_by(books, "Similarity (decreasing)", [book])
-    similar_books_calculated = books[:5]
+    similar_books_calculated = neighbour_index.most_similar(book, 5)
 
     image_links = [x.image_url for x in similar_books_calculated]
 
     # Create placeholders for similar book images and titles
-    for i in range(5):
-        placeholder_image = load_cover_image(similar_books_frame, image_links[i - 1], 110, 150)  # Placeholder image
-
-        # Create label with placeholder image
-        image_button = tk.Button(similar_books_frame, image=placeholder_image,
+    for i in range(len(similar_books_calculated)):
+        # Create label with placeholder image, replaced by the cover once it is loaded
+        image_button = tk.Button(similar_books_frame,
                                  command=lambda idx=i: open_new_page(image_index=idx,
                                                                      the_book=similar_books_calculated))
+        load_cover_image(image_button, image_links[i - 1], 110, 150)
         image_button.grid(row=1, column=i, padx=10, pady=5)
 
         # Create label for book title
         title_label = ttk.Label(similar_books_frame, text=similar_books_calculated[i - 1].title, wraplength=100)
         title_label.grid(row=2, column=i)
 
-        # Keep a reference to the image to prevent garbage collection
-        image_button.image = placeholder_image
-
     root.update_idletasks()  # Update the window to calculate widget sizes
     window_width = root.winfo_reqwidth()  # Get the requested width of the window
     window_height = root.winfo_reqheight()  # Get the requested height of the window
@@ -153,13 +144,16 @@ def open_new_page(image_index, the_book) -> None:
     create_book_page(book)
 
 
-def load_cover_image(root, cover_url, width, height) -> PhotoImage:
-    response = requests.get(cover_url)
-    image = Image.open(BytesIO(response.content))
-    image = image.resize((width, height))
-    cover_image = ImageTk.PhotoImage(image)
-    root.image = cover_image  # Keep a reference to prevent garbage collection
-    return cover_image
+def load_cover_image(widget, cover_url, width, height) -> None:
+    """ Shows a placeholder image in widget, replaced by the cover at cover_url once it is loaded"""
+    show_image(widget, cover_loader.placeholder(width, height))
+    cover_loader.load(widget, cover_url, width, height, lambda cover_image: show_image(widget, cover_image))
+
+
+def show_image(widget, image) -> None:
+    """ Shows image in widget"""
+    widget.configure(image=image)
+    widget.image = image  # Keep a reference to prevent garbage collection
 
 
 def add_to_saved(book, button) -> None:
@@ -0,0 +1,345 @@
+"""This program contains the cache of the book cover images shown by My Library Manager.
+
+Covers are downloaded once, resized to every size the pages show them at, and kept on disk under the hash
+of their URL, so that reopening a list or a book page does not download them again. The disk cache has
+a size cap, past which the least recently used covers are deleted. The most recently shown covers are also
+kept in memory, ready to be displayed.
+
+Covers that are not in memory are loaded by a pool of threads sharing one HTTP session, so their
+connections are reused. Pages show a placeholder in their place, replaced by each cover as it arrives.
+"""
+from __future__ import annotations
+import os
+import hashlib
+import queue
+import threading
+import tkinter as tk
+from io import BytesIO
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Optional
+import requests
+from requests.adapters import HTTPAdapter
+from PIL import Image, ImageTk
+from tracing import span, traced
+
+# The sizes covers are shown at: in the lists of books, and on book pages
+LIST_COVER_SIZE = (110, 150)
+PAGE_COVER_SIZE = (200, 273)
+COVER_SIZES = (LIST_COVER_SIZE, PAGE_COVER_SIZE)
+
+# The default size cap of the disk cache, in bytes, and number of covers kept in memory
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+DEFAULT_MEMORY_SIZE = 256
+
+# The default number of covers loaded at the same time
+DEFAULT_WORKERS = 8
+
+# How long a cover download waits to connect and then for each response from the server, in seconds,
+# before it fails and the placeholder stays
+COVER_TIMEOUT = (5, 10)
+
+# How often loaded covers are handed to the pages waiting for them, in milliseconds
+POLL_INTERVAL = 20
+
+# The colour of the placeholders shown until covers are loaded
+PLACEHOLDER_COLOUR = '#d9d9d9'
+
+
+def pooled_session(size: int = DEFAULT_WORKERS) -> requests.Session:
+    """Return a requests.Session that keeps up to size connections per host open for reuse.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=size, pool_maxsize=size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+class CoverCache:
+    """A cache of cover images, on disk and in memory, in front of the servers they are downloaded from.
+
+    Representation Invariants:
+        - self._disk_bytes == sum(self._files.values())
+        - len(self._photos) <= self._memory_size
+    """
+    # Private Instance Attributes:
+    #   - _directory:
+    #       The directory the resized covers are stored in.
+    #   - _max_bytes:
+    #       The size cap of the files in _directory. The least recently used files are deleted past it.
+    #   - _memory_size:
+    #       The maximum number of images kept in _photos.
+    #   - _session:
+    #       The object whose get(url) method downloads covers, such as requests or a requests.Session.
+    #   - _files:
+    #       Maps the name of each file in _directory to its size, from least to most recently used.
+    #   - _disk_bytes:
+    #       The total size of the files in _directory.
+    #   - _photos:
+    #       Maps the URL and size of the most recently shown covers to their images, from least to most
+    #       recently used. Only used from the Tk thread.
+    #   - _lock:
+    #       The lock held while reading or changing _files, since covers may be loaded from several threads.
+    #   - memory_hits:
+    #       The number of covers found in _photos.
+    #   - disk_hits:
+    #       The number of covers read from _directory.
+    #   - misses:
+    #       The number of covers downloaded.
+    _directory: str
+    _max_bytes: int
+    _memory_size: int
+    _session: Any
+    _files: OrderedDict[str, int]
+    _disk_bytes: int
+    _photos: OrderedDict[tuple[str, int, int], ImageTk.PhotoImage]
+    _lock: threading.Lock
+    memory_hits: int
+    disk_hits: int
+    misses: int
+
+    def __init__(self, directory: str, max_bytes: int = DEFAULT_MAX_BYTES, memory_size: int = DEFAULT_MEMORY_SIZE,
+                 session: Optional[Any] = None) -> None:
+        """Initialize a new CoverCache storing covers in directory, which is created if it does not exist.
+        The files already in directory are kept, and are used least recently first by modification time.
+        """
+        self._directory = directory
+        self._max_bytes = max_bytes
+        self._memory_size = memory_size
+        self._session = requests if session is None else session
+        self._photos = OrderedDict()
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        os.makedirs(directory, exist_ok=True)
+        entries = [entry for entry in os.scandir(directory) if entry.is_file() and entry.name.endswith('.png')]
+        entries.sort(key=lambda entry: entry.stat().st_mtime_ns)
+        self._files = OrderedDict((entry.name, entry.stat().st_size) for entry in entries)
+        self._disk_bytes = sum(self._files.values())
+
+    def photo(self, url: str, width: int, height: int) -> ImageTk.PhotoImage:
+        """Return the cover at url resized to width x height, ready to be shown in a Tk widget.
+
+        Preconditions:
+            - this is called from the Tk thread
+        """
+        photo = self.cached_photo(url, width, height)
+        if photo is None:
+            photo = self.add_photo(url, width, height, self.image(url, width, height))
+        return photo
+
+    def cached_photo(self, url: str, width: int, height: int) -> Optional[ImageTk.PhotoImage]:
+        """Return the cover at url resized to width x height if it is in memory, and None otherwise.
+
+        Preconditions:
+            - this is called from the Tk thread
+        """
+        key = (url, width, height)
+        photo = self._photos.get(key)
+        if photo is not None:
+            self.memory_hits += 1
+            self._photos.move_to_end(key)
+        return photo
+
+    def add_photo(self, url: str, width: int, height: int, image: Image.Image) -> ImageTk.PhotoImage:
+        """Keep image, the cover at url resized to width x height, in memory and return it ready to be shown.
+
+        Preconditions:
+            - this is called from the Tk thread
+            - image.size == (width, height)
+        """
+        photo = ImageTk.PhotoImage(image)
+        self._photos[(url, width, height)] = photo
+        if len(self._photos) > self._memory_size:
+            self._photos.popitem(last=False)
+        return photo
+
+    @traced()
+    def image(self, url: str, width: int, height: int) -> Image.Image:
+        """Return the cover at url resized to width x height, reading it from disk if it was downloaded before.
+        Covers are stored at every size in COVER_SIZES when they are downloaded.
+        Raise requests.RequestException if the download fails or the server does not answer within COVER_TIMEOUT.
+        This may be called from any thread.
+        """
+        name = self._file_name(url, width, height)
+        with self._lock:
+            cached = name in self._files
+            if cached:
+                self._files.move_to_end(name)
+
+        if cached:
+            try:
+                with Image.open(os.path.join(self._directory, name)) as image:
+                    image.load()
+                # Keep the order of use for the next launches
+                os.utime(os.path.join(self._directory, name))
+                with self._lock:
+                    self.disk_hits += 1
+                return image
+            except OSError:
+                # The file was deleted or is damaged, so download the cover again
+                self._forget(name)
+
+        with span('CoverCache.download', url=url):
+            response = self._session.get(url, timeout=COVER_TIMEOUT)
+            response.raise_for_status()
+        original = Image.open(BytesIO(response.content))
+        with self._lock:
+            self.misses += 1
+
+        sizes = set(COVER_SIZES) | {(width, height)}
+        resized = {}
+        for size in sizes:
+            resized[size] = original.resize(size)
+            self._store(self._file_name(url, *size), resized[size])
+        return resized[(width, height)]
+
+    def stats(self) -> dict[str, int]:
+        """Return the number of hits and misses of the cache, and the number and total size of its files.
+        """
+        with self._lock:
+            return {'memory_hits': self.memory_hits, 'disk_hits': self.disk_hits, 'misses': self.misses,
+                    'files': len(self._files), 'disk_bytes': self._disk_bytes}
+
+    def _file_name(self, url: str, width: int, height: int) -> str:
+        """Return the name of the file that stores the cover at url resized to width x height.
+        """
+        return f'{hashlib.blake2b(url.encode(), digest_size=16).hexdigest()}_{width}x{height}.png'
+
+    def _store(self, name: str, image: Image.Image) -> None:
+        """Write image to the file name in the cache directory, then delete the least recently used files
+        until the cache is within its size cap.
+        """
+        path = os.path.join(self._directory, name)
+        temporary_path = f'{path}.{threading.get_ident()}.tmp'
+        if image.mode not in ('RGB', 'RGBA', 'L', 'LA', 'P'):
+            image = image.convert('RGB')
+        image.save(temporary_path, format='PNG')
+        os.replace(temporary_path, path)
+        size = os.path.getsize(path)
+
+        with self._lock:
+            self._disk_bytes += size - self._files.pop(name, 0)
+            self._files[name] = size
+            evicted = []
+            # Never evict the file just written, even if it alone is over the cap
+            while self._disk_bytes > self._max_bytes and len(self._files) > 1:
+                evicted_name, evicted_size = self._files.popitem(last=False)
+                self._disk_bytes -= evicted_size
+                evicted.append(evicted_name)
+
+        for evicted_name in evicted:
+            try:
+                os.remove(os.path.join(self._directory, evicted_name))
+            except OSError:
+                pass
+
+    def _forget(self, name: str) -> None:
+        """Remove the file name from the files of the cache, after it could not be read.
+        """
+        with self._lock:
+            self._disk_bytes -= self._files.pop(name, 0)
+
+
+class CoverLoader:
+    """Loads covers from a CoverCache in a pool of threads, and hands them to the widgets that show them
+    in the Tk thread.
+
+    Worker threads never touch Tk: they put loaded covers in a queue that the Tk thread polls every
+    POLL_INTERVAL milliseconds while covers are being loaded.
+
+    Representation Invariants:
+        - self._pending >= 0
+    """
+    # Private Instance Attributes:
+    #   - _cache:
+    #       The cache covers are loaded from.
+    #   - _executor:
+    #       The pool of threads that load covers.
+    #   - _loaded:
+    #       The covers loaded by the threads and not handed to their widgets yet, with their request.
+    #   - _pending:
+    #       The number of requested covers not handed to their widgets yet.
+    #   - _polling:
+    #       Whether the Tk thread is polling _loaded.
+    #   - _placeholders:
+    #       Maps each size to the placeholder image shown at that size.
+    _cache: CoverCache
+    _executor: ThreadPoolExecutor
+    _loaded: queue.SimpleQueue
+    _pending: int
+    _polling: bool
+    _placeholders: dict[tuple[int, int], tk.PhotoImage]
+
+    def __init__(self, cache: CoverCache, workers: int = DEFAULT_WORKERS) -> None:
+        """Initialize a new CoverLoader that loads covers from cache with workers threads.
+        """
+        self._cache = cache
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='cover')
+        self._loaded = queue.SimpleQueue()
+        self._pending = 0
+        self._polling = False
+        self._placeholders = {}
+
+    def placeholder(self, width: int, height: int) -> tk.PhotoImage:
+        """Return the image shown at width x height until a cover is loaded.
+
+        Preconditions:
+            - this is called from the Tk thread, after the Tk root window is created
+        """
+        if (width, height) not in self._placeholders:
+            image = tk.PhotoImage(width=width, height=height)
+            image.put(PLACEHOLDER_COLOUR, to=(0, 0, width, height))
+            self._placeholders[(width, height)] = image
+        return self._placeholders[(width, height)]
+
+    def load(self, widget: tk.Misc, url: str, width: int, height: int,
+             callback: Callable[[ImageTk.PhotoImage], Any]) -> Optional[Future]:
+        """Load the cover at url resized to width x height for widget, and call callback with it in the Tk thread.
+        callback is called right away if the cover is in memory, and is never called if widget is destroyed
+        before the cover is loaded or the cover cannot be loaded, including when its download times out.
+        Return the Future of the load, which can be cancelled, or None if the cover was in memory.
+
+        Preconditions:
+            - this is called from the Tk thread
+        """
+        photo = self._cache.cached_photo(url, width, height)
+        if photo is not None:
+            callback(photo)
+            return None
+
+        future = self._executor.submit(self._cache.image, url, width, height)
+        future.add_done_callback(lambda f: self._loaded.put((widget, url, width, height, callback, f)))
+        self._pending += 1
+        if not self._polling:
+            self._polling = True
+            # Poll from the root window, which lives as long as the application
+            root = widget.nametowidget('.')
+            root.after(POLL_INTERVAL, lambda: self._hand_over(root))
+        return future
+
+    def close(self) -> None:
+        """Cancel the covers that are not being loaded yet, without waiting for the others.
+        """
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _hand_over(self, root: tk.Misc) -> None:
+        """Hand the loaded covers to their widgets, and poll again if more covers are being loaded.
+        """
+        while True:
+            try:
+                widget, url, width, height, callback, future = self._loaded.get_nowait()
+            except queue.Empty:
+                break
+            self._pending -= 1
+            if future.cancelled() or future.exception() is not None or not widget.winfo_exists():
+                continue
+            callback(self._cache.add_photo(url, width, height, future.result()))
+
+        if self._pending > 0:
+            root.after(POLL_INTERVAL, lambda: self._hand_over(root))
+        else:
+            self._polling = False
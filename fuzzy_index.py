@@ -0,0 +1,163 @@
+"""This program contains the typo tolerant search of My Library Manager.
+
+The titles and author names of the books are indexed by their trigrams, the strings of three consecutive
+characters in them. A misspelled query still shares most of its trigrams with the title or name it was meant
+to match, so the strings that share the most trigrams with a query are found in the index first, and only
+these candidates are ranked by edit distance.
+"""
+from __future__ import annotations
+from array import array
+from typing import Iterable
+import numpy as np
+from my_library_manager_data import Book
+from search_index import tokenize
+
+# The most titles and author names that are ranked by edit distance for a query, chosen among those that
+# share the most trigrams with it
+MAX_CANDIDATES = 128
+
+# The largest number of edits per character of a query for a title or author name to match it
+MAX_EDIT_RATE = 1 / 3
+
+
+def normalize(text: str) -> str:
+    """Return text in lowercase, with its words separated by single spaces and no punctuation.
+
+    >>> normalize("  The Hobbit, or There and Back Again")
+    'the hobbit or there and back again'
+    """
+    return ' '.join(tokenize(text))
+
+
+def trigrams(text: str) -> set[str]:
+    """Return the trigrams of text, padded with a space on each side so that its ends have trigrams too.
+
+    >>> sorted(trigrams('cat'))
+    [' ca', 'at ', 'cat']
+    """
+    padded = f' {text} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def substring_distance(pattern: str, text: str) -> int:
+    """Return the smallest edit distance between pattern and any substring of text, that is, the fewest
+    characters to insert, delete or replace in pattern to make it appear in text.
+
+    >>> substring_distance('hary', 'harry potter'), substring_distance('poter', 'harry potter')
+    (1, 1)
+    >>> substring_distance('tolkein', 'j r r tolkien')
+    2
+    """
+    # previous[j] is the distance between pattern[:j] and the best substring of text ending at the current character
+    previous = list(range(len(pattern) + 1))
+    best = previous[-1]
+    for char in text:
+        current = [0]
+        for j, pattern_char in enumerate(pattern, start=1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (pattern_char != char)))
+        best = min(best, current[-1])
+        previous = current
+    return best
+
+
+class TrigramIndex:
+    """A trigram index over the titles and author names of books, for searches that tolerate typos.
+
+    Representation Invariants:
+        - len(self._strings) == len(self._book_ids)
+        - all(0 <= i < len(self._strings) for ids in self._postings.values() for i in ids)
+    """
+    # Private Instance Attributes:
+    #   - _books:
+    #       The indexed books. The id of a book is its index in this list.
+    #   - _strings:
+    #       The distinct normalized titles and author names of the books.
+    #   - _book_ids:
+    #       _book_ids[i] is the increasing ids of the books whose title or an author is _strings[i].
+    #   - _postings:
+    #       Maps each trigram to the increasing indices of the strings in _strings that contain it.
+    _books: list[Book]
+    _strings: list[str]
+    _book_ids: list[array]
+    _postings: dict[str, np.ndarray]
+
+    def __init__(self, books: Iterable[Book]) -> None:
+        """Initialize a new TrigramIndex over the titles and authors of the given books.
+        The "No information available" placeholder of books without known authors is not indexed.
+        """
+        self._books = list(books)
+        self._strings = []
+        self._book_ids = []
+        string_ids = {}
+
+        for book_id, book in enumerate(self._books):
+            for text in [book.title, *book.authors]:
+                if text == "No information available":
+                    continue
+                string = normalize(text)
+                if not string:
+                    continue
+                if string not in string_ids:
+                    string_ids[string] = len(self._strings)
+                    self._strings.append(string)
+                    self._book_ids.append(array('I'))
+                ids = self._book_ids[string_ids[string]]
+                if not ids or ids[-1] != book_id:
+                    ids.append(book_id)
+
+        postings = {}
+        for string_id, string in enumerate(self._strings):
+            for trigram in trigrams(string):
+                if trigram not in postings:
+                    postings[trigram] = array('I')
+                postings[trigram].append(string_id)
+        self._postings = {trigram: np.frombuffer(ids, dtype=np.uint32) for trigram, ids in postings.items()}
+
+    def search(self, query: str, limit: int = 20) -> list[Book]:
+        """Return at most limit books whose title or an author approximately contains query, from the
+        closest to the furthest match.
+
+        Titles and names are ranked by the edit distance between query and their closest substring, and
+        match if it is at most MAX_EDIT_RATE edits per character of query (and at least one edit).
+        Only the MAX_CANDIDATES titles and names that share the most trigrams with query are ranked, so a
+        close match may be missed when many strings share as many trigrams with query.
+
+        >>> b1 = Book('1', 'The Hobbit', ['J.R.R. Tolkien'], set(), set(), 4.2, 10, 2, '', '1937', '', '')
+        >>> b2 = Book('2', 'Dune', ['Frank Herbert'], set(), set(), 4.3, 10, 3, '', '1965', '', '')
+        >>> index = TrigramIndex([b1, b2])
+        >>> [str(b) for b in index.search('tolkein')], [str(b) for b in index.search('frank herbret')]
+        (['The Hobbit'], ['Dune'])
+        """
+        query = normalize(query)
+        query_trigrams = [trigram for trigram in trigrams(query) if trigram in self._postings]
+        if not query or not query_trigrams:
+            return []
+
+        # Each edit changes at most 3 trigrams of query, and matching inside a word loses its 2 padded ones
+        max_edits = max(1, int(len(query) * MAX_EDIT_RATE))
+        min_overlap = max(1, len(trigrams(query)) - 3 * max_edits - 2)
+
+        overlap = np.bincount(np.concatenate([self._postings[trigram] for trigram in query_trigrams]),
+                              minlength=len(self._strings))
+        candidates = np.flatnonzero(overlap >= min_overlap)
+        if len(candidates) > MAX_CANDIDATES:
+            candidates = candidates[np.argpartition(-overlap[candidates], MAX_CANDIDATES - 1)[:MAX_CANDIDATES]]
+
+        ranking = []
+        for string_id in candidates.tolist():
+            string = self._strings[string_id]
+            distance = substring_distance(query, string)
+            if distance <= max_edits:
+                ranking.append((distance, -int(overlap[string_id]), len(string), string_id))
+        ranking.sort()
+
+        results = []
+        seen = set()
+        for _, _, _, string_id in ranking:
+            for book_id in self._book_ids[string_id]:
+                if book_id not in seen:
+                    seen.add(book_id)
+                    results.append(self._books[book_id])
+                    if len(results) == limit:
+                        return results
+        return results
@@ -2,11 +2,73 @@
 Copyright 2024 Areesha Abidi
 """
 from my_library_manager_data import *
+from similarity import SimilarityEngine
+from lsh_index import MinHashLSHIndex
+from neighbours import load_neighbour_index
+from snapshot import load_snapshot, save_snapshot
+from parallel_loader import load_catalog_parallel
+from lazy_fields import LazyFieldStore
+from search_index import SearchIndex
+from fuzzy_index import TrigramIndex
 
-genres = get_genres("data/goodreads_book_genres_initial.json")
-genres_list = genres[0]
-authors = load_authors("data/goodreads_book_authors.json")
-books_to_display = list(load_books(genres[1], authors, "data/goodreads_books_medium.json"))
+# Set to True to find the similar books on a book page with an approximate MinHash/LSH index instead of
+# scoring the whole catalog, which is about 5x faster on large catalogs but finds only about two thirds of
+# the most similar books (see MinHashLSHIndex)
+USE_LSH_INDEX = False
+
+GENRES_FILE = "data/goodreads_book_genres_initial.json"
+AUTHORS_FILE = "data/goodreads_book_authors.json"
+BOOKS_FILE = "data/goodreads_books_medium.json"
+SOURCE_FILES = [GENRES_FILE, AUTHORS_FILE, BOOKS_FILE]
+
+# Built by running neighbours.py, and used for the similar books on a book page when it is up to date
+NEIGHBOURS_FILE = "data/neighbours.npy"
+
+# Set to False to keep the description and links of every book in memory instead of reading them from
+# BOOKS_FILE when a book is shown
+LAZY_BOOK_FIELDS = True
+set_lazy_field_store(LazyFieldStore(BOOKS_FILE))
+
+# Saved after the data files are first loaded, and loaded instead of them until they change
+SNAPSHOT_FILE = "data/catalog.snapshot"
+
+catalog = load_snapshot(SNAPSHOT_FILE, SOURCE_FILES, options={'lazy': LAZY_BOOK_FIELDS})
+if catalog is None:
+    genres_list, book_genres, authors, books_to_display, descriptions = \
+        load_catalog_parallel(GENRES_FILE, AUTHORS_FILE, BOOKS_FILE, lazy=LAZY_BOOK_FIELDS)
+
+    books = list(books_to_display)
+    filter_index = load_filter_index(genres_list, books)
+    # Index the descriptions parsed with the books, instead of reading each lazy book back from BOOKS_FILE
+    search_index = SearchIndex(books, descriptions)
+    del descriptions
+    fuzzy_index = TrigramIndex(books)
+    sort_index = SortIndex(books)
+
+    # The tree is left out, since pickling recurses once per level of it, and rebuilding it is faster than
+    # unpickling it anyway
+    save_snapshot(SNAPSHOT_FILE, SOURCE_FILES, {'genres_list': genres_list, 'authors': authors,
+                                                'books_to_display': books_to_display,
+                                                'filter_index': filter_index, 'search_index': search_index,
+                                                'fuzzy_index': fuzzy_index, 'sort_index': sort_index},
+                  options={'lazy': LAZY_BOOK_FIELDS})
+else:
+    genres_list = catalog['genres_list']
+    authors = catalog['authors']
+    books_to_display = catalog['books_to_display']
+    filter_index = catalog['filter_index']
+    search_index = catalog['search_index']
+    fuzzy_index = catalog['fuzzy_index']
+    sort_index = catalog['sort_index']
+
+    books = list(books_to_display)
 
-books = list(books_to_display)
 tree = load_tree(genres_list, books)
+set_sort_index(sort_index)
+
+similarity_engine = SimilarityEngine(books)
+set_similarity_engine(similarity_engine)
+if USE_LSH_INDEX:
+    neighbour_index = MinHashLSHIndex(books)
+else:
+    neighbour_index = load_neighbour_index(NEIGHBOURS_FILE, SOURCE_FILES, books, similarity_engine)
@@ -0,0 +1,75 @@
+"""This program contains the store that lazy books read their description, book_url and image_url from.
+
+Lazy books only keep the byte offset of their entry in the books data file, so that the descriptions of the
+whole catalog do not have to be kept in memory. The fields of the most recently used entries are cached.
+"""
+from __future__ import annotations
+import json
+import threading
+from collections import OrderedDict
+from typing import Any
+from my_library_manager_data import get_heavy_fields
+
+# The number of entries whose fields are cached by default
+DEFAULT_CACHE_SIZE = 256
+
+
+class LazyFieldStore:
+    """A store that reads the description, book_url and image_url of books from a books data file by offset,
+    with a least recently used (LRU) cache in front of the file.
+
+    Representation Invariants:
+        - len(self._cache) <= self._cache_size
+    """
+    # Private Instance Attributes:
+    #   - _path:
+    #       The path of the books data file.
+    #   - _file:
+    #       The books data file, opened for reading in binary mode.
+    #   - _cache_size:
+    #       The maximum number of entries whose fields are cached.
+    #   - _cache:
+    #       Maps the offset of each cached entry to its fields, from least to most recently used.
+    #   - _lock:
+    #       The lock held while reading the file or the cache, since books may be read from several threads.
+    _path: str
+    _file: Any
+    _cache_size: int
+    _cache: OrderedDict[int, tuple[str, str, str]]
+    _lock: threading.Lock
+
+    def __init__(self, path: str, cache_size: int = DEFAULT_CACHE_SIZE) -> None:
+        """Initialize a new LazyFieldStore over the books data file at path.
+        """
+        self._path = path
+        self._file = None
+        self._cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def fields(self, offset: int) -> tuple[str, str, str]:
+        """Return the description, book_url and image_url of the entry at the given byte offset of the file.
+        """
+        with self._lock:
+            fields = self._cache.get(offset)
+            if fields is not None:
+                self._cache.move_to_end(offset)
+                return fields
+
+            if self._file is None:
+                self._file = open(self._path, 'rb')
+            self._file.seek(offset)
+            fields = get_heavy_fields(json.loads(self._file.readline()))
+
+            self._cache[offset] = fields
+            if len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+            return fields
+
+    def close(self) -> None:
+        """Close the books data file. It is opened again if more fields are read.
+        """
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
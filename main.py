@@ -2,8 +2,14 @@
 Copyright 2024 Areesha Abidi
 """
 import tkinter as tk
-from main_frame1 import Frame1Main
-from main_frame2 import Frame2Main
+import tracing
+import memory_report
+from bookpage import cover_loader
+from main_frame1 import Frame1Main, live_search_runner
+from main_frame2 import Frame2Main, query_runner
+
+# Where the trace is written when tracing is on (see tracing.py), by pressing F12 or on closing the window
+TRACE_FILE = "data/trace.json"
 
 
 def center_window(window, width, height) -> None:
@@ -35,10 +41,41 @@ class MainApplication(tk.Tk):
         frame1_main.grid(row=0, column=0, sticky="nsew")
         frame2_main.grid(row=1, column=0, sticky="nw")
 
+        if tracing.tracer is not None:
+            self.bind("<F12>", lambda event: dump_trace())
+        # The memory snapshot taken by the last press of F11, which the next press is compared to
+        self.memory_snapshot = None
+        self.bind("<F11>", lambda event: self.report_memory())
+
+    def report_memory(self) -> None:
+        """Prints the memory used by each part of the application, and how it changed since the last time F11 was
+        pressed. Run with python -X tracemalloc=25 main.py to also see the lines of code that allocated it"""
+        snapshot = memory_report.take_snapshot(memory_report.application_subsystems(), label="F11")
+        print(memory_report.format_snapshot(snapshot))
+        if self.memory_snapshot is not None:
+            print("Change since the last snapshot:")
+            print(memory_report.format_diff(memory_report.diff_snapshots(self.memory_snapshot, snapshot)))
+        self.memory_snapshot = snapshot
+
+
+def dump_trace() -> None:
+    """Writes the spans recorded so far to TRACE_FILE as a Chrome trace, and prints their summary"""
+    tracing.tracer.dump(TRACE_FILE)
+    print(tracing.tracer.format_summary())
+    print(f"Trace written to {TRACE_FILE}")
+
 
 def main():
     app = MainApplication()
     app.mainloop()
+    # Cancel the covers that are not being loaded yet and the queries that are running. Python still waits for
+    # the worker threads before exiting: the queries stop at their next cancellation check, and the covers
+    # being downloaded give up once the server stops answering for COVER_TIMEOUT
+    cover_loader.close()
+    query_runner.close()
+    live_search_runner.close()
+    if tracing.tracer is not None:
+        dump_trace()
 
 
 if __name__ == "__main__":
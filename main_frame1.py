@@ -7,6 +7,37 @@ from ttkbootstrap import ttk
 from bookpage import saved_books_library
 from scroll_frame import ScrollingFrame
 from gettingdata import books_to_display as all_books
+from gettingdata import search_index, fuzzy_index
+from search_index import LiveSearch
+from query_runner import QueryRunner, QueryCancelled
+
+# Set to False to search by whether the search text is in the title of a book, instead of searching
+# the titles, authors and descriptions with the search index
+USE_SEARCH_INDEX = True
+
+# Set to False to show nothing when no book matches a search, instead of the books whose title or author
+# is closest to the search text, for searches with typos
+FUZZY_SEARCH = True
+# The number of closest books shown when no book matches a search
+FUZZY_SEARCH_LIMIT = 20
+
+# Set to False to only search when the Search button is pressed, instead of also showing results while typing
+LIVE_SEARCH = USE_SEARCH_INDEX
+# How long to wait after the last key press before searching, in milliseconds
+LIVE_SEARCH_DELAY = 250
+# The shortest search text that is searched while typing, since shorter ones match most of the catalog
+LIVE_SEARCH_MIN_LENGTH = 2
+# The number of best matches shown while typing
+LIVE_SEARCH_LIMIT = 40
+# How often a running live search is checked for its results, in milliseconds
+LIVE_SEARCH_POLL_INTERVAL = 20
+
+# Searches the search index, reusing the results of the previous searches as the search text grows
+live_search = LiveSearch(search_index)
+
+# Runs the searches made while typing or with the Search button in a worker thread, so that the window is never
+# blocked by a search. A key press or a new search cancels the search before it
+live_search_runner = QueryRunner()
 
 
 def saved_books_window() -> None:
@@ -23,25 +54,21 @@ def saved_books_window() -> None:
     saved_books_scrolling_frame.grid(row=1, column=0)
 
 
-def search_books(search_entry) -> None:
-    """ Opens the search results for the input user makes in Entry 'search_entry'"""
-    search_text = search_entry.get()  # Get the input
-    if search_text:
-        # Get all the Books that have the search_text str in their title
-        filtered_books = [book for book in all_books if search_text.lower() in book.title.lower()]
-        if filtered_books:
-            search_top = tk.Toplevel()  # Create a new instance of Toplevel
-            title_label = ttk.Label(search_top, text=f"Books containing '{search_text}' in title", font="Arial, 15")
-            title_label.grid(row=0, column=0, pady=10)
-            scrolling_frame = ScrollingFrame(search_top, filtered_books)
-            scrolling_frame.grid(row=1, column=0)
-
-
 class Frame1Main(ttk.Frame):
     """Displays the top frame of the main window. Includes access to search, and saved books"""
     def __init__(self, master=None):
         super().__init__(master)
         self.master = master
+        # The pending live search, the live search running, the last search text whose results are shown while
+        # typing, and the window of its results
+        self.pending_live_search = None
+        self.running_live_search = None
+        self.live_search_text = None
+        self.live_results_top = None
+        self.live_results_title = None
+        self.live_results_frame = None
+        # The search running for the Search button
+        self.running_search = None
         self.create_widgets()
 
     def create_widgets(self) -> None:
@@ -55,9 +82,12 @@ class Frame1Main(ttk.Frame):
         search_entry = ttk.Entry(self, width=40)
         search_entry.grid(row=0, column=4, sticky="ew", padx=5)
 
-        search_button = ttk.Button(self, text="Search", command=lambda: search_books(search_entry))
+        search_button = ttk.Button(self, text="Search", command=lambda: self.search_books(search_entry))
         search_button.grid(row=0, column=5, sticky="w", padx=5)
 
+        if LIVE_SEARCH:
+            search_entry.bind("<KeyRelease>", lambda event: self.schedule_live_search(search_entry))
+
         spacer = ttk.Label(self, width=30)
         spacer.grid(row=0, column=6, sticky="nesw")
 
@@ -67,3 +97,121 @@ class Frame1Main(ttk.Frame):
         # Line under the frame for design
         visible_spacer = ttk.Label(self, width=4, font='Arial, 2', background="black")
         visible_spacer.grid(row=1, column=0, columnspan=15, sticky="ew")
+
+    def search_books(self, search_entry) -> None:
+        """ Command. Searches the input user makes in Entry 'search_entry' in the worker thread, and opens its
+        results once they are ready. The search of a live search or an earlier press is cancelled"""
+        search_text = search_entry.get()  # Get the input
+        if not search_text:
+            return
+        if self.pending_live_search is not None:
+            self.after_cancel(self.pending_live_search)
+            self.pending_live_search = None
+        self.running_live_search = None
+        query = live_search_runner.submit(lambda token: find_search_results(search_text, token))
+        self.running_search = query
+        self.after(LIVE_SEARCH_POLL_INTERVAL, lambda: self.show_search_results(query))
+
+    def show_search_results(self, query) -> None:
+        """ Opens the results of query, the search of the Search button, once it is done, unless it was
+        cancelled by a later search"""
+        if query is not self.running_search:
+            return
+        if not query.done():
+            self.after(LIVE_SEARCH_POLL_INTERVAL, lambda: self.show_search_results(query))
+            return
+        self.running_search = None
+        try:
+            filtered_books, title_text = query.result()
+        except QueryCancelled:
+            return
+        if filtered_books:
+            search_top = tk.Toplevel()  # Create a new instance of Toplevel
+            title_label = ttk.Label(search_top, text=title_text, font="Arial, 15")
+            title_label.grid(row=0, column=0, pady=10)
+            scrolling_frame = ScrollingFrame(search_top, filtered_books)
+            scrolling_frame.grid(row=1, column=0)
+
+    def schedule_live_search(self, search_entry) -> None:
+        """ Command. Shows the results for the input in 'search_entry' once the user stops typing for
+        LIVE_SEARCH_DELAY milliseconds, so that no search is made for the text in between"""
+        if self.pending_live_search is not None:
+            self.after_cancel(self.pending_live_search)
+        # The search running for the text before this key press is out of date
+        live_search_runner.cancel()
+        self.running_live_search = None
+        self.running_search = None
+        self.pending_live_search = self.after(LIVE_SEARCH_DELAY, lambda: self.start_live_search(search_entry))
+
+    def start_live_search(self, search_entry) -> None:
+        """ Searches the input in 'search_entry' in the worker thread, and shows the results once they are
+        ready"""
+        self.pending_live_search = None
+        search_text = search_entry.get().strip()
+        if search_text == self.live_search_text or len(search_text) < LIVE_SEARCH_MIN_LENGTH:
+            return
+        query = live_search_runner.submit(lambda token: find_live_results(search_text, token))
+        self.running_live_search = query
+        self.after(LIVE_SEARCH_POLL_INTERVAL, lambda: self.show_live_results(query, search_text, search_entry))
+
+    def show_live_results(self, query, search_text, search_entry) -> None:
+        """ Shows the results of query, the live search of 'search_text', in the live results window once it
+        is done, replacing the previous results, unless the user typed something else since"""
+        if query is not self.running_live_search:
+            return
+        if not query.done():
+            self.after(LIVE_SEARCH_POLL_INTERVAL, lambda: self.show_live_results(query, search_text, search_entry))
+            return
+        self.running_live_search = None
+        try:
+            filtered_books, title_text = query.result()
+        except QueryCancelled:
+            return
+        self.live_search_text = search_text
+
+        if self.live_results_top is None or not self.live_results_top.winfo_exists():
+            self.live_results_top = tk.Toplevel()
+            self.live_results_title = ttk.Label(self.live_results_top, font="Arial, 15")
+            self.live_results_title.grid(row=0, column=0, pady=10)
+            self.live_results_frame = None
+            # Keep typing in the search bar while the window opens. Later results only replace the contents
+            # of the window, without raising or focusing it
+            search_entry.focus_force()
+        elif self.live_results_frame is not None:
+            self.live_results_frame.destroy()
+            self.live_results_frame = None
+
+        if filtered_books:
+            self.live_results_title.configure(text=title_text)
+            self.live_results_frame = ScrollingFrame(self.live_results_top, filtered_books)
+            self.live_results_frame.grid(row=1, column=0)
+        else:
+            self.live_results_title.configure(text=f"No results for '{search_text}'")
+
+
+def find_live_results(search_text, cancel_token) -> tuple:
+    """ Returns the best matches for 'search_text' and the title of their window, or the closest books if
+    nothing matches. Runs in the worker thread of live_search_runner"""
+    filtered_books = live_search.search(search_text, LIVE_SEARCH_LIMIT)
+    if filtered_books or not FUZZY_SEARCH:
+        return filtered_books, f"Search results for '{search_text}'"
+    cancel_token.raise_if_cancelled()
+    return fuzzy_index.search(search_text, FUZZY_SEARCH_LIMIT), f"Close matches for '{search_text}'"
+
+
+def find_search_results(search_text, cancel_token) -> tuple:
+    """ Returns the books matching 'search_text' and the title of their window, or the closest books if
+    nothing matches. Runs in the worker thread of live_search_runner, for the Search button"""
+    if USE_SEARCH_INDEX:
+        # Get the Books that match every word of search_text, best matches first
+        filtered_books = live_search.search(search_text)
+        title_text = f"Search results for '{search_text}'"
+    else:
+        # Get all the Books that have the search_text str in their title
+        filtered_books = [book for book in all_books if search_text.lower() in book.title.lower()]
+        title_text = f"Books containing '{search_text}' in title"
+    if filtered_books or not FUZZY_SEARCH:
+        return filtered_books, title_text
+    cancel_token.raise_if_cancelled()
+    # Get the Books whose title or author is closest to search_text
+    return fuzzy_index.search(search_text, FUZZY_SEARCH_LIMIT), f"Close matches for '{search_text}'"
@@ -2,6 +2,7 @@
 
 Copyright 2024 Areesha Abidi
 """
+import time
 from tkinter import messagebox
 from gettingdata import genres_list
 import ttkbootstrap as ttk
@@ -9,6 +10,22 @@ from gettingdata import books_to_display as books
 from gettingdata import tree
 from scroll_frame import ScrollingFrame
 from bookpage import saved_books_library
+from query_runner import QueryRunner, QueryCancelled
+from query_cache import QueryCache
+
+# How often a running query is checked for its results, in milliseconds
+QUERY_POLL_INTERVAL = 50
+
+# The number of books sorted and shown at a time in the results of the Apply button. The next ones are
+# sorted when they are scrolled to
+PAGE_SIZE = 40
+
+# Runs the queries of the Apply button in a worker thread, so the window stays responsive while they run
+query_runner = QueryRunner()
+
+# Keeps the results of the most recent queries, so that applying the same filters again is instant.
+# query_cache.stats() gives its hit rate and the time it saved
+query_cache = QueryCache()
 
 
 class CheckbuttonDrawer(ttk.Frame):
@@ -90,6 +107,12 @@ class Frame2Main(ttk.Frame):
         self.apply_button = ttk.Button(self.another_frame2, text="Apply", command=self.apply_changes)
         self.apply_button.grid(row=5, column=0, sticky="ew", padx=5, pady=5)
 
+        # Shown while a query runs. Created once, and hidden when no query runs
+        self.progress_label = ttk.Label(self.another_frame2, text="Loading...")
+        self.progress_bar = ttk.Progressbar(self.another_frame2, mode="indeterminate")
+        # The Future of the query whose results will be shown
+        self.running_query = None
+
         self.blank = ttk.Label(self, text="")
         self.blank.grid(row=0, column=1, sticky="ew", padx=100, pady=100)
 
@@ -99,27 +122,118 @@ class Frame2Main(ttk.Frame):
 
     def apply_changes(self) -> None:
         """Command for the apply button. When the button is pressed, this will receive the sequence and call
-         tree.get_books_filter_sort and then display the results on the page"""
-
-        messagebox.showinfo("My Library Manager", "Loading, please wait")  # Takes time to load so let user know
+         tree.get_books_pages in a worker thread, then display the first page of results once it is ready.
+         A query still running when the button is pressed again is cancelled"""
         # Retrieve checkbox states and sorting option
         all_states = []
         all_states.extend(self.ratings_drawer.get_checkbox_states())
         all_states.extend(self.book_length_drawer.get_checkbox_states())
         all_states.extend(self.genres_drawer.get_checkbox_states())
-        data = ttk.Label(self, text="")
-        data.grid(row=5, column=0, sticky="w", padx=5, pady=5)
 
         sort_selection = self.sort_combo.get()
-        data2 = ttk.Label(self, text="")
-        data2.grid(row=6, column=0, sticky="w", padx=5, pady=5)
-
+        # Copy the saved books, since they may change while the query runs
+        library = list(saved_books_library.library)
+        library_version = saved_books_library.version
+
+        cached_pages = query_cache.get(all_states, sort_selection, library_version)
+        if cached_pages is not None:
+            # Cancel any query still running, since its results would replace these
+            query_runner.cancel()
+            self.running_query = None
+            self.hide_progress()
+            self.display_books(cached_pages, (all_states, sort_selection, library_version))
+            return
+
+        query = query_runner.submit(lambda token: timed(first_page, all_states, sort_selection, library, token))
+        self.running_query = query
+
+        # Let the user know the query is running, without blocking the window
+        self.progress_label.grid(row=6, column=0, sticky="w", padx=5)
+        self.progress_bar.grid(row=7, column=0, sticky="ew", padx=5, pady=5)
+        self.progress_bar.start()
+        cache_key = (all_states, sort_selection, library_version)
+        self.after(QUERY_POLL_INTERVAL, lambda: self.show_results(query, cache_key))
+
+    def show_results(self, query, cache_key) -> None:
+        """Displays the results of query once it is done, unless another query was started after it, and caches
+        them under cache_key, the filter sequence, sort mode and saved books version of the query"""
+        if query is not self.running_query:
+            return
+        if not query.done():
+            self.after(QUERY_POLL_INTERVAL, lambda: self.show_results(query, cache_key))
+            return
+
+        self.running_query = None
+        self.hide_progress()
+
+        try:
+            pages, seconds = query.result()
+        except QueryCancelled:
+            return
+        except Exception as error:
+            messagebox.showerror("My Library Manager", f"The books could not be filtered: {error}")
+            return
+
+        query_cache.put(*cache_key, pages, seconds)
+        self.display_books(pages, cache_key)
+
+    def hide_progress(self) -> None:
+        """Hides the progress bar shown while a query runs"""
+        self.progress_bar.stop()
+        self.progress_bar.grid_forget()
+        self.progress_label.grid_forget()
+
+    def display_books(self, pages, cache_key) -> None:
+        """Displays the first page of pages, the BookPages of the results cached under cache_key, replacing the books
+        displayed. The next pages are fetched as they are scrolled to"""
         self.blank.destroy()
         self.scrolling1.destroy()
 
         # Recreate ScrollingFrame instance with updated data
-        new_books = tree.get_books_filter_sort(all_states, sort_selection, saved_books_library.library)
-        self.scrolling1 = ScrollingFrame(self, new_books)
+        fetch_books = lambda frame, offset: self.fetch_books(pages, cache_key, frame, offset)
+        self.scrolling1 = ScrollingFrame(self, pages.page(0, PAGE_SIZE), total=len(pages), fetch_books=fetch_books)
         self.scrolling1.grid(row=0, column=2, sticky="nw", padx=5, pady=5)
 
-        messagebox.showinfo("My Library Manager", "Filtering Complete")
+    def fetch_books(self, pages, cache_key, scrolling_frame, offset) -> None:
+        """Sorts the page of pages from offset in the worker thread, and adds it to the books of scrolling_frame once
+        it is ready. The time it took is added to the cached results under cache_key, since later hits skip it"""
+        if self.running_query is not None:
+            # New results are coming, so do not cancel their query for books that will be replaced
+            scrolling_frame.add_books(offset, [])
+            return
+
+        query = query_runner.submit(lambda token: timed(pages.page, offset, PAGE_SIZE, token))
+        self.after(QUERY_POLL_INTERVAL, lambda: self.show_page(query, pages, cache_key, scrolling_frame, offset))
+
+    def show_page(self, query, pages, cache_key, scrolling_frame, offset) -> None:
+        """Adds the books of query, the page from offset, to scrolling_frame once it is done, unless other books
+        are displayed now"""
+        if scrolling_frame is not self.scrolling1:
+            return
+        if not query.done():
+            self.after(QUERY_POLL_INTERVAL, lambda: self.show_page(query, pages, cache_key, scrolling_frame, offset))
+            return
+
+        try:
+            new_books, seconds = query.result()
+            query_cache.record(*cache_key, pages, seconds)
+        except QueryCancelled:
+            new_books = []
+        except Exception as error:
+            messagebox.showerror("My Library Manager", f"The books could not be sorted: {error}")
+            new_books = []
+        scrolling_frame.add_books(offset, new_books)
+
+
+def first_page(filter_sequence, sort_by, library, cancel_token):
+    """Returns the BookPages of the books matching the query, with the first page sorted"""
+    pages = tree.get_books_pages(filter_sequence, sort_by, library)
+    pages.page(0, PAGE_SIZE, cancel_token)
+    return pages
+
+
+def timed(function, *args) -> tuple:
+    """Returns the result of function(*args) and the time it took, in seconds"""
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
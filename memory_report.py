@@ -0,0 +1,357 @@
+"""This program reports how much memory the data structures of My Library Manager use.
+
+The memory is attributed to each subsystem built by gettingdata.py (the books, their genre and tag sets, the
+tree, the indexes) and to those of the GUI (the cover images and the result pages), by deep size and object
+count. Snapshots of these, with the process RSS and, when tracemalloc is tracing, the lines that allocated
+the most memory, can be taken at two points in time and diffed to find what grew.
+
+Run it as a script to print a report for the data loaded by gettingdata.py, for example:
+    python -X tracemalloc=25 memory_report.py --output before.json
+    python memory_report.py --diff before.json
+In the application, press F11 to print the change since the previous press (see main.py).
+"""
+from __future__ import annotations
+import gc
+import os
+import sys
+import json
+import time
+import tracemalloc
+from collections import Counter
+from typing import Any, Optional
+from my_library_manager_data import Book, shelf_vocabulary
+
+# The number of object types, and of allocation sites traced by tracemalloc, kept in a snapshot
+TOP_TYPES = 10
+TOP_ALLOCATION_SITES = 200
+
+
+def deep_sizeof(obj: Any, seen: set[int]) -> int:
+    """Return the number of bytes used by obj and every object it refers to that is not in seen.
+    The ids of all the counted objects are added to seen, so an object shared by several others
+    is only counted once.
+
+    >>> deep_sizeof(['ab', 'ab'], set()) == sys.getsizeof(['ab', 'ab']) + sys.getsizeof('ab')
+    True
+    """
+    return deep_usage(obj, seen)[0]
+
+
+def deep_usage(obj: Any, seen: set[int]) -> tuple[int, Counter[str]]:
+    """Return the number of bytes used by obj and every object it refers to that is not in seen, and the
+    number of these objects of each type. seen is updated like in deep_sizeof.
+    Tk images are counted with the pixels Tk keeps for them, at 4 bytes per pixel, and Tk widgets are counted
+    without the objects they refer to.
+
+    >>> deep_usage(['ab', 'ab', 'cd'], set())[1]
+    Counter({'str': 2, 'list': 1})
+    """
+    total = 0
+    counts = Counter()
+    stack = [obj]
+    while stack:
+        item = stack.pop()
+        if id(item) in seen:
+            continue
+        seen.add(id(item))
+        total += sys.getsizeof(item)
+        counts[type(item).__name__] += 1
+
+        if isinstance(item, dict):
+            stack.extend(item.keys())
+            stack.extend(item.values())
+        elif isinstance(item, (list, tuple, set, frozenset)):
+            stack.extend(item)
+        elif _is_tk_image(item):
+            # The pixels are kept by Tk, and the other attributes lead to the whole Tk application
+            total += _tk_image_bytes(item)
+        elif _is_tk_widget(item):
+            # A widget refers to its master and children, which would count the whole window
+            pass
+        else:
+            if hasattr(item, '__dict__'):
+                stack.append(item.__dict__)
+            for slot in getattr(type(item), '__slots__', ()):
+                if hasattr(item, slot):
+                    stack.append(getattr(item, slot))
+    return total, counts
+
+
+def _is_tk_image(item: Any) -> bool:
+    """Return whether item is a Tk image, a tkinter.PhotoImage or a PIL.ImageTk.PhotoImage.
+    """
+    return type(item).__name__ in ('PhotoImage', 'BitmapImage') and hasattr(item, 'width')
+
+
+def _is_tk_widget(item: Any) -> bool:
+    """Return whether item is a Tk widget or window.
+    """
+    return 'tkinter' in sys.modules and isinstance(item, sys.modules['tkinter'].Misc)
+
+
+def _tk_image_bytes(image: Any) -> int:
+    """Return the bytes used by the pixels of the Tk image, or 0 if Tk no longer has it.
+    """
+    try:
+        return image.width() * image.height() * 4
+    except Exception:  # the image or the Tk application was destroyed
+        return 0
+
+
+def _copy_str(data: Any) -> Any:
+    """Return a new copy of data if it is a string, like the one json.loads would create for each book.
+    """
+    if isinstance(data, str):
+        return data.encode().decode()
+    else:
+        return data
+
+
+class _UnslottedBook:
+    """A book stored the way books were stored before Book had __slots__, used as a baseline.
+    Each instance has its own __dict__ and its own sets of genre and tag strings.
+    It keeps the same fields in memory as the book it copies: if that book reads its description, book_url and
+    image_url from the lazy field store, only the offset of its entry is kept here too, so that the report
+    measures __slots__ and interning alone.
+    """
+
+    def __init__(self, book: Book) -> None:
+        self.isbn = _copy_str(book.isbn)
+        self.title = _copy_str(book.title)
+        self.authors = [_copy_str(author) for author in book.authors]
+        self.genres = {_copy_str(genre) for genre in book.genres}
+        self.tags = {_copy_str(tag) for tag in book.tags}
+        self.average_rating = book.average_rating
+        self.ratings_count = book.ratings_count
+        self.length = book.length
+        self.pub_year = _copy_str(book.pub_year)
+        self.book_id = _copy_str(book.book_id)
+        if isinstance(book._heavy, int):
+            self.heavy_offset = book._heavy
+        else:
+            self.description = _copy_str(book.description)
+            self.book_url = _copy_str(book.book_url)
+            self.image_url = _copy_str(book.image_url)
+
+
+def book_memory_report(books: list[Book]) -> dict[str, float]:
+    """Return the memory used by books, and the memory the same books would use without __slots__
+    and interned shelves. Both keep the same fields in memory, whether or not the books are lazy.
+
+    The returned dictionary maps:
+        - 'books': the number of books
+        - 'compact_bytes': bytes used by books, including shelf_vocabulary
+        - 'unslotted_bytes': bytes the same books use with a __dict__ and sets of strings each
+        - 'compact_bytes_per_book', 'unslotted_bytes_per_book', 'saved_bytes_per_book': the above per book
+    """
+    seen = set()
+    compact = deep_sizeof(books, seen) + deep_sizeof(shelf_vocabulary, seen)
+    unslotted = deep_sizeof([_UnslottedBook(book) for book in books], set())
+
+    n = max(len(books), 1)
+    return {
+        'books': len(books),
+        'compact_bytes': compact,
+        'unslotted_bytes': unslotted,
+        'compact_bytes_per_book': compact / n,
+        'unslotted_bytes_per_book': unslotted / n,
+        'saved_bytes_per_book': (unslotted - compact) / n
+    }
+
+
+def print_book_memory_report(books: list[Book]) -> None:
+    """Print the report returned by book_memory_report(books).
+    """
+    report = book_memory_report(books)
+    print(f"Books: {report['books']}")
+    print(f"Compact books:   {report['compact_bytes']:>14,} bytes "
+          f"({report['compact_bytes_per_book']:,.0f} per book)")
+    print(f"Unslotted books: {report['unslotted_bytes']:>14,} bytes "
+          f"({report['unslotted_bytes_per_book']:,.0f} per book)")
+    print(f"Saved: {report['saved_bytes_per_book']:,.0f} bytes per book")
+
+
+def subsystem_usage(subsystems: dict[str, Any]) -> dict[str, dict[str, Any]]:
+    """Return the bytes and objects used by each subsystem, where subsystems maps the name of each subsystem to
+    a list of the objects it is made of.
+
+    Objects shared by several subsystems are counted in the first of them in subsystems, so list the
+    subsystems that own shared objects first: for example, the books before the tree that holds them.
+    Each subsystem maps to a dictionary of 'bytes', the number of 'objects' and the numbers of the TOP_TYPES
+    most common 'types' of objects.
+
+    >>> usage = subsystem_usage({'words': ['ab', 'cd'], 'more words': ['ab', 'ef']})
+    >>> usage['words']['objects'], usage['more words']['objects']
+    (2, 1)
+    """
+    seen = set()
+    # The containers of the subsystems are not part of any of them
+    seen.add(id(subsystems))
+    for objects in subsystems.values():
+        seen.add(id(objects))
+
+    usage = {}
+    for name, objects in subsystems.items():
+        size, counts = 0, Counter()
+        for item in (objects if isinstance(objects, (list, tuple)) else [objects]):
+            item_size, item_counts = deep_usage(item, seen)
+            size += item_size
+            counts += item_counts
+        usage[name] = {'bytes': size, 'objects': sum(counts.values()), 'types': dict(counts.most_common(TOP_TYPES))}
+    return usage
+
+
+def application_subsystems() -> dict[str, Any]:
+    """Return the subsystems of My Library Manager that are loaded, by name, in the order subsystem_usage
+    expects. The data of gettingdata.py is loaded if it is not already, but the GUI never is: its subsystems are
+    only included if its modules were imported.
+    """
+    import gettingdata
+
+    books = gettingdata.books
+    subsystems = {
+        'genre and tag sets': [shelf_vocabulary],
+        'Book objects': [books, gettingdata.books_to_display],
+        'Tree nodes': [gettingdata.tree],
+        'filter index': [gettingdata.filter_index],
+        'sort index': [gettingdata.sort_index],
+        'search index': [gettingdata.search_index],
+        'fuzzy index': [gettingdata.fuzzy_index],
+        'similarity engine': [gettingdata.similarity_engine],
+        'neighbour index': [gettingdata.neighbour_index],
+        'authors and genres': [gettingdata.authors, gettingdata.genres_list],
+    }
+
+    if 'bookpage' in sys.modules:
+        bookpage = sys.modules['bookpage']
+        subsystems['saved books'] = [bookpage.saved_books_library]
+        subsystems['cover cache'] = [bookpage.cover_cache, bookpage.cover_loader]
+    if 'main_frame1' in sys.modules:
+        subsystems['live search'] = [sys.modules['main_frame1'].live_search]
+    if 'main_frame2' in sys.modules:
+        subsystems['query cache'] = [sys.modules['main_frame2'].query_cache]
+    if 'scroll_frame' in sys.modules:
+        # The images held by every ScrollingFrame still alive, including those of destroyed result pages
+        # that something still refers to
+        frame_type = sys.modules['scroll_frame'].ScrollingFrame
+        frames = [obj for obj in gc.get_objects() if isinstance(obj, frame_type)]
+        subsystems['ScrollingFrame images'] = [frame.images for frame in frames]
+        subsystems['ScrollingFrame objects'] = frames
+    return subsystems
+
+
+def take_snapshot(subsystems: dict[str, Any], label: str = '') -> dict[str, Any]:
+    """Return a snapshot of the memory used now: the subsystem_usage of subsystems, the RSS of the process and,
+    if tracemalloc is tracing, the TOP_ALLOCATION_SITES lines of code that allocated the most memory still in use.
+    Snapshots are plain dictionaries, which can be saved as JSON and diffed with diff_snapshots.
+    """
+    snapshot = {'label': label, 'time': time.time(), 'rss': _current_rss(),
+                'subsystems': subsystem_usage(subsystems), 'allocations': None}
+
+    if tracemalloc.is_tracing():
+        # Leave out the memory of tracemalloc and of the reports themselves
+        traced = tracemalloc.take_snapshot().filter_traces([tracemalloc.Filter(False, tracemalloc.__file__),
+                                                            tracemalloc.Filter(False, __file__)])
+        snapshot['allocations'] = {f'{stat.traceback[0].filename}:{stat.traceback[0].lineno}':
+                                   {'bytes': stat.size, 'objects': stat.count}
+                                   for stat in traced.statistics('lineno')[:TOP_ALLOCATION_SITES]}
+    return snapshot
+
+
+def diff_snapshots(earlier: dict[str, Any], later: dict[str, Any]) -> dict[str, Any]:
+    """Return how the memory changed from the earlier snapshot to the later one: the change of RSS, and the
+    change of bytes and objects of each subsystem and allocation site, from the largest growth to the largest
+    shrink. Subsystems and sites missing from a snapshot count as empty in it.
+
+    >>> a = {'rss': 100, 'subsystems': {'x': {'bytes': 10, 'objects': 1}}, 'allocations': None}
+    >>> b = {'rss': 150, 'subsystems': {'x': {'bytes': 30, 'objects': 2}}, 'allocations': None}
+    >>> diff_snapshots(a, b)
+    {'rss': 50, 'subsystems': {'x': {'bytes': 20, 'objects': 1}}, 'allocations': None}
+    """
+    rss = later['rss'] - earlier['rss'] if later['rss'] is not None and earlier['rss'] is not None else None
+    allocations = None
+    if earlier['allocations'] is not None and later['allocations'] is not None:
+        allocations = _diff_usage(earlier['allocations'], later['allocations'])
+    return {'rss': rss, 'subsystems': _diff_usage(earlier['subsystems'], later['subsystems']),
+            'allocations': allocations}
+
+
+def _diff_usage(earlier: dict[str, dict], later: dict[str, dict]) -> dict[str, dict[str, int]]:
+    """Return the change of bytes and objects of each key of earlier or later, which map keys to dictionaries with
+    'bytes' and 'objects', from the largest growth to the largest shrink. Unchanged keys are left out.
+    """
+    empty = {'bytes': 0, 'objects': 0}
+    changes = {}
+    for key in list(earlier) + [key for key in later if key not in earlier]:
+        before, after = earlier.get(key, empty), later.get(key, empty)
+        change = {'bytes': after['bytes'] - before['bytes'], 'objects': after['objects'] - before['objects']}
+        if change['bytes'] or change['objects']:
+            changes[key] = change
+    return dict(sorted(changes.items(), key=lambda item: item[1]['bytes'], reverse=True))
+
+
+def _current_rss() -> Optional[int]:
+    """Return the resident set size of the process in bytes, or None if it is not known on this platform.
+    """
+    try:
+        with open('/proc/self/statm') as file:
+            return int(file.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def format_snapshot(snapshot: dict[str, Any]) -> str:
+    """Return the subsystems of snapshot as a table, from the one using the most memory to the least.
+    """
+    rows = sorted(snapshot['subsystems'].items(), key=lambda item: item[1]['bytes'], reverse=True)
+    lines = [f"{'subsystem':<24} {'bytes':>16} {'objects':>12}  most common objects"]
+    for name, usage in rows:
+        types = ', '.join(f'{type_name} {count:,}' for type_name, count in list(usage['types'].items())[:3])
+        lines.append(f"{name:<24} {usage['bytes']:>16,} {usage['objects']:>12,}  {types}")
+    total = sum(usage['bytes'] for usage in snapshot['subsystems'].values())
+    lines.append(f"{'total':<24} {total:>16,}")
+    if snapshot['rss'] is not None:
+        lines.append(f"{'process RSS':<24} {snapshot['rss']:>16,}")
+    return '\n'.join(lines)
+
+
+def format_diff(diff: dict[str, Any], top: int = 10) -> str:
+    """Return the diff returned by diff_snapshots as a table, with the top allocation sites that changed most.
+    """
+    lines = [f"{'subsystem':<24} {'bytes':>16} {'objects':>12}"]
+    for name, change in diff['subsystems'].items():
+        lines.append(f"{name:<24} {change['bytes']:>+16,} {change['objects']:>+12,}")
+    if diff['rss'] is not None:
+        lines.append(f"{'process RSS':<24} {diff['rss']:>+16,}")
+    if diff['allocations']:
+        lines.append('Allocation sites that changed most:')
+        sites = sorted(diff['allocations'].items(), key=lambda item: abs(item[1]['bytes']), reverse=True)
+        for site, change in sites[:top]:
+            lines.append(f"  {change['bytes']:>+14,} bytes {change['objects']:>+10,} objects  {site}")
+    return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Report the memory used by the data of My Library Manager. "
+                                                 "Run with python -X tracemalloc=25 to include allocation sites.")
+    parser.add_argument('--books', action='store_true',
+                        help="report the memory saved by compact books instead of the subsystems")
+    parser.add_argument('--output', help="a file to save the snapshot to as JSON")
+    parser.add_argument('--diff', help="a snapshot saved earlier with --output, to print the change since")
+    arguments = parser.parse_args()
+
+    if arguments.books:
+        from gettingdata import books as all_books
+
+        print_book_memory_report(all_books)
+    else:
+        current = take_snapshot(application_subsystems(), label='memory_report')
+        print(format_snapshot(current))
+        if arguments.output:
+            with open(arguments.output, 'w') as output:
+                json.dump(current, output, indent=2)
+        if arguments.diff:
+            with open(arguments.diff) as earlier_file:
+                print(format_diff(diff_snapshots(json.load(earlier_file), current)))
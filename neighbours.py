@@ -0,0 +1,221 @@
+"""This program precomputes the most similar books of every book in the catalog, so that book pages
+do not have to score the whole catalog each time they are opened.
+
+Run it as a script to build the neighbours file for the data files used by gettingdata.py. The build is
+split into shards of the catalog that are scored in parallel by a pool of processes, and is skipped when
+the data files have not changed since the last build.
+"""
+from __future__ import annotations
+import os
+import json
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Optional
+import numpy as np
+from scipy import sparse
+from my_library_manager_data import Book
+from similarity import encode_shelves, pairwise_scores, top_k
+from snapshot import source_fingerprint
+
+# The number of neighbours stored for each book
+DEFAULT_K = 10
+
+# The number of scores a worker computes at once. A block of books is scored against the whole catalog, and
+# pairwise_scores holds about five dense arrays of 8 bytes per score, so this bounds each worker to about
+# 160 MB however large the catalog is
+_BLOCK_SCORES = 4 * 1024 * 1024
+
+# The largest number of books scored at once by a worker, for small catalogs
+_MAX_BLOCK_SIZE = 256
+
+# The encoded catalog and number of neighbours used by the worker processes, set by _init_worker
+_worker_state = {}
+
+
+class NeighbourIndex:
+    """The precomputed neighbours of the books in a catalog, read from a neighbours file.
+
+    The file is memory-mapped, so only the pages of the books that are looked up are read from disk.
+    It holds one record per book, sorted by book id, with the ids and similarity scores of the
+    book's neighbours from most to least similar.
+
+    Representation Invariants:
+        - self._k == self._records['neighbours'].shape[1]
+    """
+    # Private Instance Attributes:
+    #   - _records:
+    #       The memory-mapped records of the neighbours file.
+    #   - _books_by_id:
+    #       Maps the GoodReads id of each book in the catalog to the book.
+    #   - _k:
+    #       The number of neighbours stored for each book.
+    #   - _fallback:
+    #       The index used for books that are not in the file, or when more than _k neighbours are asked for.
+    _records: np.ndarray
+    _books_by_id: dict[int, Book]
+    _k: int
+    _fallback: Optional[Any]
+
+    def __init__(self, path: str, books: list[Book], fallback: Optional[Any] = None) -> None:
+        """Initialize a NeighbourIndex from the neighbours file at path, for the given catalog of books.
+        fallback is an object with a most_similar(book, k) method, such as a similarity.SimilarityEngine.
+        """
+        self._records = np.load(path, mmap_mode='r')
+        self._books_by_id = {int(book.book_id): book for book in books if book.book_id.isdigit()}
+        self._k = self._records['neighbours'].shape[1]
+        self._fallback = fallback
+
+    def most_similar(self, book: Book, k: int) -> list[Book]:
+        """Return the k books of the catalog that are most similar to book, from most to least similar.
+        """
+        record = self._find(book)
+        if record is None or k > self._k:
+            if self._fallback is None:
+                return []
+            return self._fallback.most_similar(book, k)
+
+        neighbour_ids = record['neighbours'][:k].tolist()
+        return [self._books_by_id[book_id] for book_id in neighbour_ids if book_id in self._books_by_id]
+
+    def _find(self, book: Book) -> Optional[np.void]:
+        """Return the record of book, or None if book is not in the neighbours file.
+        """
+        if not book.book_id.isdigit():
+            return None
+
+        book_id = int(book.book_id)
+        ids = self._records['book_id']
+        i = int(np.searchsorted(ids, book_id))
+        if i < len(ids) and ids[i] == book_id:
+            return self._records[i]
+        else:
+            return None
+
+
+def is_up_to_date(path: str, source_files: list[str], k: int = DEFAULT_K) -> bool:
+    """Return whether the neighbours file at path was built from the current source files with k neighbours.
+    """
+    try:
+        with open(path + '.json', 'r') as file:
+            metadata = json.load(file)
+    except (OSError, ValueError):
+        return False
+
+    return os.path.exists(path) and metadata == {'k': k, 'sources': source_fingerprint(source_files)}
+
+
+def build_neighbours(books: list[Book], source_files: list[str], path: str, k: int = DEFAULT_K,
+                     workers: Optional[int] = None, shard_size: int = 1024, force: bool = False) -> bool:
+    """Compute the k most similar books of every book and write them to the neighbours file at path.
+    Return whether the file was rebuilt, which is skipped if it is already up to date with the source files,
+    unless force is True.
+
+    Only books whose book_id is a number are included. The catalog is split into shards of shard_size books
+    that are scored by a pool of workers processes, or in this process if workers == 1.
+    """
+    if not force and is_up_to_date(path, source_files, k):
+        return False
+
+    books = sorted((book for book in books if book.book_id.isdigit()), key=lambda b: int(b.book_id))
+    matrix, sizes, has_tags = encode_shelves(books)
+    shards = [(start, min(start + shard_size, len(books))) for start in range(0, len(books), shard_size)]
+
+    if workers == 1:
+        _init_worker(matrix, sizes, has_tags, k)
+        results = [_neighbours_of_shard(shard) for shard in shards]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(matrix, sizes, has_tags, k)) as executor:
+            results = list(executor.map(_neighbours_of_shard, shards))
+
+    book_ids = np.array([int(book.book_id) for book in books] + [-1], dtype=np.int64)
+    records = np.zeros(len(books), dtype=[('book_id', np.int64), ('neighbours', np.int64, (k,)),
+                                          ('scores', np.float32, (k,))])
+    records['book_id'] = book_ids[:-1]
+    for (start, end), (rows, scores) in zip(shards, results):
+        # Rows of -1 (no neighbour) map to the book id -1
+        records['neighbours'][start:end] = book_ids[rows]
+        records['scores'][start:end] = scores
+
+    _write_atomically(path, records)
+    with open(path + '.json', 'w') as file:
+        json.dump({'k': k, 'sources': source_fingerprint(source_files)}, file)
+    return True
+
+
+def load_neighbour_index(path: str, source_files: list[str], books: list[Book],
+                         fallback: Any, k: int = DEFAULT_K) -> Any:
+    """Return a NeighbourIndex over the neighbours file at path if it is up to date with the source files,
+    and fallback otherwise.
+    """
+    if is_up_to_date(path, source_files, k):
+        return NeighbourIndex(path, books, fallback)
+    else:
+        return fallback
+
+
+def _init_worker(matrix: sparse.csr_matrix, sizes: np.ndarray, has_tags: np.ndarray, k: int) -> None:
+    """Store the encoded catalog in a worker process.
+    """
+    _worker_state['matrix'] = matrix
+    _worker_state['sizes'] = sizes
+    _worker_state['has_tags'] = has_tags
+    _worker_state['k'] = k
+
+
+def _neighbours_of_shard(shard: tuple[int, int]) -> tuple[np.ndarray, np.ndarray]:
+    """Return the rows and scores of the k most similar books of each book in the shard [start, end) of the
+    catalog. Rows of missing neighbours, when the catalog has at most k books, are -1 with a score of 0.
+    """
+    matrix, sizes, has_tags, k = (_worker_state['matrix'], _worker_state['sizes'], _worker_state['has_tags'],
+                                  _worker_state['k'])
+    start, end = shard
+    found = min(k, matrix.shape[0] - 1)
+    rows = np.full((end - start, k), -1, dtype=np.int64)
+    scores = np.zeros((end - start, k), dtype=np.float32)
+
+    block_size = _block_size(matrix.shape[0])
+    for block_start in range(start, end, block_size):
+        block_end = min(block_start + block_size, end)
+        block_scores = pairwise_scores(matrix[block_start:block_end], sizes[block_start:block_end],
+                                       has_tags[block_start:block_end], matrix, sizes, has_tags)
+        for i in range(block_end - block_start):
+            row_scores = block_scores[i]
+            # A book is not its own neighbour
+            row_scores[block_start + i] = -np.inf
+            if found > 0:
+                best = top_k(row_scores, found)
+                rows[block_start + i - start, :found] = best
+                scores[block_start + i - start, :found] = row_scores[best]
+
+    return rows, scores
+
+
+def _block_size(n: int) -> int:
+    """Return the number of books a worker scores at once against a catalog of n books, so that it holds
+    at most about _BLOCK_SCORES scores.
+
+    >>> _block_size(1000), _block_size(100_000), _block_size(1_000_000), _block_size(100_000_000)
+    (256, 41, 4, 1)
+    """
+    return max(1, min(_MAX_BLOCK_SIZE, _BLOCK_SCORES // max(n, 1)))
+
+
+def _write_atomically(path: str, records: np.ndarray) -> None:
+    """Write records to path as a .npy file, replacing it only once the whole file has been written.
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    temporary_path = path + '.tmp'
+    with open(temporary_path, 'wb') as file:
+        np.save(file, records)
+    os.replace(temporary_path, path)
+
+
+if __name__ == '__main__':
+    from gettingdata import books as all_books, SOURCE_FILES, NEIGHBOURS_FILE
+
+    if build_neighbours(all_books, SOURCE_FILES, NEIGHBOURS_FILE):
+        print(f"Wrote the neighbours of {len(all_books)} books to {NEIGHBOURS_FILE}")
+    else:
+        print(f"{NEIGHBOURS_FILE} is up to date")
@@ -0,0 +1,153 @@
+"""This program loads the GoodReads JSON-lines data files in parallel.
+
+Each file is split into chunks of whole lines by byte range, and the chunks of all three files are parsed
+by a pool of processes. The results are merged in file order, so the loaded data is the same for any number
+of processes. orjson is used to decode the lines when it is installed.
+"""
+from __future__ import annotations
+import os
+import json
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Iterable, Iterator, Optional
+from my_library_manager_data import Book, parse_book_entry, book_from_fields
+from tracing import traced
+
+try:
+    import orjson
+    _loads = orjson.loads
+except ImportError:
+    _loads = json.loads
+
+# Files smaller than this in total are parsed in this process, where starting a pool would take longer
+# than the parsing itself
+MIN_PARALLEL_BYTES = 8 * 1024 * 1024
+
+# The number of chunks each file is split into per worker, so that workers that finish early can take
+# the chunks of slower ones
+CHUNKS_PER_WORKER = 4
+
+
+@traced()
+def load_catalog_parallel(genre_file: str, authors_file: str, book_file: str, workers: Optional[int] = None,
+                          lazy: bool = False) -> tuple[list[str], dict[str, set[str]], dict[str, str], list[Book],
+                                                       list[str]]:
+    """Return the genre list, book genres and authors mappings, and the list of books loaded from the data files,
+    as get_genres, load_authors and load_books(..., lazy) would, and the descriptions of the books.
+    Books are listed in the order of the books file, and descriptions[i] is the description of books[i].
+    The descriptions are parsed by the workers along with the rest of the books, so that the search index can be
+    built from them instead of reading them back from the file one at a time when the books are lazy.
+
+    The files are parsed by a pool of workers processes (by default, one per core), or in this process if
+    workers == 1 or the files are smaller than MIN_PARALLEL_BYTES in total.
+    The pool forks this process, since this is called while modules are being imported and spawned workers
+    would import them again. Where fork is not available, the files are parsed in this process.
+    """
+    files = [(genre_file, _parse_genres), (authors_file, _parse_authors),
+             (book_file, _parse_lazy_books if lazy else _parse_books)]
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if sum(os.path.getsize(path) for path, _ in files) < MIN_PARALLEL_BYTES \
+            or 'fork' not in multiprocessing.get_all_start_methods():
+        workers = 1
+
+    tasks = []
+    for path, parser in files:
+        for start, end in chunk_ranges(path, workers * CHUNKS_PER_WORKER):
+            tasks.append((parser, path, start, end))
+
+    if workers == 1:
+        results = [_run_task(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('fork')) as executor:
+            results = list(executor.map(_run_task, tasks))
+
+    genre_list = []
+    seen_genres = set()
+    book_genres = {}
+    authors = {}
+    book_records = []
+    for (parser, _, _, _), result in zip(tasks, results):
+        if parser is _parse_genres:
+            for book_id, genres in result:
+                book_genres[book_id] = set(genres)
+                for genre in genres:
+                    if genre not in seen_genres:
+                        seen_genres.add(genre)
+                        genre_list.append(genre)
+        elif parser is _parse_authors:
+            authors.update(result)
+        else:
+            book_records.extend(result)
+
+    books = [book_from_fields(fields, book_genres, authors) for fields in book_records]
+    descriptions = [fields[8] for fields in book_records]
+    return genre_list, book_genres, authors, books, descriptions
+
+
+def chunk_ranges(path: str, n: int) -> list[tuple[int, int]]:
+    """Split the file at path into at most n byte ranges [start, end) of whole lines, in file order.
+    """
+    size = os.path.getsize(path)
+    if size == 0:
+        return []
+
+    boundaries = [0]
+    with open(path, 'rb') as file:
+        for i in range(1, n):
+            offset = max(size * i // n, boundaries[-1])
+            file.seek(offset)
+            # Move the boundary to the start of the next line
+            file.readline()
+            offset = file.tell()
+            if offset >= size:
+                break
+            if offset > boundaries[-1]:
+                boundaries.append(offset)
+    boundaries.append(size)
+    return list(zip(boundaries, boundaries[1:]))
+
+
+def _run_task(task: tuple[Callable[[Iterable[tuple[int, dict]]], list], str, int, int]) -> list:
+    """Parse the lines of the given byte range of a file and return the result of the parser on its entries.
+    """
+    parser, path, start, end = task
+    with open(path, 'rb') as file:
+        file.seek(start)
+        data = file.read(end - start)
+    return parser(_entries(data, start))
+
+
+def _entries(data: bytes, start: int) -> Iterator[tuple[int, dict[str, Any]]]:
+    """Yield the byte offset and decoded entry of each line of data, which begins at offset start of its file.
+    Entries are decoded one at a time, so that only the parsed fields of each entry are kept.
+    """
+    offset = start
+    for line in data.splitlines(keepends=True):
+        if line.strip():
+            yield offset, _loads(line)
+        offset += len(line)
+
+
+def _parse_genres(entries: Iterable[tuple[int, dict[str, Any]]]) -> list[tuple[str, list[str]]]:
+    """Return the book_id and the list of genres of each entry of the genres file.
+    """
+    return [(entry["book_id"], list(entry["genres"])) for _, entry in entries]
+
+
+def _parse_authors(entries: Iterable[tuple[int, dict[str, Any]]]) -> list[tuple[str, str]]:
+    """Return the author_id and name of each entry of the authors file.
+    """
+    return [(entry["author_id"], entry["name"]) for _, entry in entries]
+
+
+def _parse_books(entries: Iterable[tuple[int, dict[str, Any]]]) -> list[tuple]:
+    """Return the fields of each entry of the books file, as returned by parse_book_entry.
+    """
+    return [parse_book_entry(entry) for _, entry in entries]
+
+
+def _parse_lazy_books(entries: Iterable[tuple[int, dict[str, Any]]]) -> list[tuple]:
+    """Return the fields of each entry of the books file for lazy books, as returned by parse_book_entry.
+    """
+    return [parse_book_entry(entry, offset) for offset, entry in entries]
@@ -0,0 +1,171 @@
+"""This program contains the cache of the results of the filter and sort queries of My Library Manager.
+
+Users apply the same filters again and again, so the results of the most recent queries are kept, up to
+a total number of books, and the least recently used results are dropped past it. Only similarity sorts
+depend on the saved books, so only their results are dropped when the saved books change.
+"""
+from __future__ import annotations
+from collections import OrderedDict
+from typing import Hashable, Optional
+from my_library_manager_data import Book, BookPages
+
+# The sort mode whose results depend on the saved books
+SIMILARITY_SORT = 'Similarity (decreasing)'
+
+# The default maximum total number of books in the cached results
+DEFAULT_MAX_BOOKS = 1_000_000
+
+
+class QueryCache:
+    """A least recently used cache of query results, bounded by the total number of books they contain.
+
+    Results are cached under (filter sequence, sort mode, library version), where the library version is
+    the version of the saved books for similarity sorts and None for the other sort modes.
+    This is not thread safe: it is used from the Tk thread only.
+
+    Representation Invariants:
+        - self._total_books == sum(len(books) for books, _ in self._results.values())
+        - self._total_books <= self._max_books
+
+    >>> cache = QueryCache(max_books=3)
+    >>> cache.get([1, 0], 'Title (A-Z)', 0) is None
+    True
+    >>> cache.put([1, 0], 'Title (A-Z)', 0, ['b1', 'b2'], 0.5)
+    >>> cache.get([1, 0], 'Title (A-Z)', 7)
+    ['b1', 'b2']
+    >>> cache.stats()['hits'], cache.stats()['saved_seconds']
+    (1, 0.5)
+    """
+    # Private Instance Attributes:
+    #   - _max_books:
+    #       The maximum total number of books in the cached results.
+    #   - _results:
+    #       Maps the key of each cached query to its result and the time it took to compute, in seconds,
+    #       from least to most recently used. The time of BookPages includes every page sorted so far.
+    #   - _total_books:
+    #       The total number of books in the cached results.
+    #   - _library_version:
+    #       The latest version of the saved books seen. Similarity results of older versions are dropped.
+    #   - hits:
+    #       The number of queries answered from the cache.
+    #   - misses:
+    #       The number of queries that were not in the cache.
+    #   - saved_seconds:
+    #       The total time the queries answered from the cache took to compute, which hits saved.
+    _max_books: int
+    _results: OrderedDict[Hashable, tuple[list[Book] | BookPages, float]]
+    _total_books: int
+    _library_version: Optional[int]
+    hits: int
+    misses: int
+    saved_seconds: float
+
+    def __init__(self, max_books: int = DEFAULT_MAX_BOOKS) -> None:
+        """Initialize a new, empty QueryCache holding results of at most max_books books in total.
+        """
+        self._max_books = max_books
+        self._results = OrderedDict()
+        self._total_books = 0
+        self._library_version = None
+        self.hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+
+    def get(self, filter_sequence: list[int], sort_by: str, library_version: int) -> Optional[list[Book] | BookPages]:
+        """Return the cached result of the query, or None if it is not cached.
+        library_version is the version of the saved books the query is run with.
+        The returned books must not be mutated.
+        """
+        self._see_library_version(library_version)
+        key = _key(filter_sequence, sort_by, library_version)
+        if key not in self._results:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self._results.move_to_end(key)
+        books, seconds = self._results[key]
+        self.saved_seconds += seconds
+        return books
+
+    def put(self, filter_sequence: list[int], sort_by: str, library_version: int, books: list[Book] | BookPages,
+            seconds: float) -> None:
+        """Cache books, the result of the query as a list or as BookPages, which took seconds to compute.
+        The size of BookPages is the number of books in all their pages.
+        The least recently used results are dropped until the cache is within its size. Results of more
+        than the maximum number of books, and similarity results of an older version of the saved books than
+        the latest one seen, are not cached. books must not be mutated after this.
+
+        >>> cache = QueryCache()
+        >>> cache.get([1], SIMILARITY_SORT, 2) is None
+        True
+        >>> cache.put([1], SIMILARITY_SORT, 1, ['b1'], 0.5)
+        >>> cache.put([1], 'Title (A-Z)', 1, ['b1'], 0.5)
+        >>> cache.get([1], SIMILARITY_SORT, 2) is None, cache.get([1], 'Title (A-Z)', 2)
+        (True, ['b1'])
+        """
+        self._see_library_version(library_version)
+        stale = sort_by == SIMILARITY_SORT and library_version != self._library_version
+        if stale or len(books) > self._max_books:
+            return
+
+        key = _key(filter_sequence, sort_by, library_version)
+        self._discard(key)
+        self._results[key] = (books, seconds)
+        self._total_books += len(books)
+        while self._total_books > self._max_books:
+            self._discard(next(iter(self._results)))
+
+    def record(self, filter_sequence: list[int], sort_by: str, library_version: int, books: list[Book] | BookPages,
+               seconds: float) -> None:
+        """Add seconds, the time taken to sort another page of books, to the time the query took to compute.
+        books are the cached BookPages of the query, which keep the pages sorted, so a later hit saves that
+        time as well. Nothing is recorded if books are no longer the cached result of the query.
+
+        >>> cache = QueryCache()
+        >>> pages = ['b1', 'b2']
+        >>> cache.put([1], 'Title (A-Z)', 0, pages, 0.5)
+        >>> cache.record([1], 'Title (A-Z)', 0, pages, 0.25)
+        >>> cache.record([1], 'Title (A-Z)', 0, ['b1', 'b2'], 4.0)
+        >>> cache.get([1], 'Title (A-Z)', 0) is pages, cache.stats()['saved_seconds']
+        (True, 0.75)
+        """
+        key = _key(filter_sequence, sort_by, library_version)
+        if key in self._results and self._results[key][0] is books:
+            self._results[key] = (books, self._results[key][1] + seconds)
+
+    def clear(self) -> None:
+        """Drop every cached result. The statistics are kept.
+        """
+        self._results.clear()
+        self._total_books = 0
+
+    def stats(self) -> dict[str, float]:
+        """Return the hits, misses, hit rate and seconds saved by the cache, and the number of results and
+        books it holds.
+        """
+        queries = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses, 'hit_rate': self.hits / queries if queries else 0.0,
+                'saved_seconds': self.saved_seconds, 'results': len(self._results), 'books': self._total_books}
+
+    def _see_library_version(self, library_version: int) -> None:
+        """Drop the similarity results of older versions of the saved books when a newer version is seen.
+        Similarity results of a version older than the latest one seen are neither returned nor cached.
+        """
+        if self._library_version is None or library_version > self._library_version:
+            self._library_version = library_version
+            for key in [key for key in self._results if key[1] == SIMILARITY_SORT]:
+                self._discard(key)
+
+    def _discard(self, key: Hashable) -> None:
+        """Drop the result cached under key, if there is one.
+        """
+        if key in self._results:
+            books, _ = self._results.pop(key)
+            self._total_books -= len(books)
+
+
+def _key(filter_sequence: list[int], sort_by: str, library_version: int) -> tuple:
+    """Return the key of the query in the cache.
+    """
+    return tuple(filter_sequence), sort_by, library_version if sort_by == SIMILARITY_SORT else None
@@ -0,0 +1,102 @@
+"""This program runs the filter and sort queries of My Library Manager away from the Tk thread, so that the
+window stays responsive while a long query runs.
+
+Queries are run one at a time by a worker thread. Starting a query cancels the one before it: each query
+is given a CancelToken that it checks between steps, and stops with QueryCancelled once it is cancelled.
+"""
+from __future__ import annotations
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+
+class QueryCancelled(Exception):
+    """Raised by a query that stopped because it was cancelled."""
+
+
+class CancelToken:
+    """A flag that tells a running query to stop.
+
+    >>> token = CancelToken()
+    >>> token.raise_if_cancelled()
+    >>> token.cancel()
+    >>> token.raise_if_cancelled()
+    Traceback (most recent call last):
+    ...
+    query_runner.QueryCancelled
+    """
+    # Private Instance Attributes:
+    #   - _event:
+    #       Set once the token is cancelled.
+    _event: threading.Event
+
+    def __init__(self) -> None:
+        """Initialize a new CancelToken that is not cancelled.
+        """
+        self._event = threading.Event()
+
+    def cancel(self) -> None:
+        """Tell the query holding this token to stop.
+        """
+        self._event.set()
+
+    def is_cancelled(self) -> bool:
+        """Return whether this token was cancelled.
+        """
+        return self._event.is_set()
+
+    def raise_if_cancelled(self) -> None:
+        """Raise QueryCancelled if this token was cancelled.
+        """
+        if self._event.is_set():
+            raise QueryCancelled
+
+
+class QueryRunner:
+    """Runs queries one at a time in a worker thread, where each new query supersedes the previous one.
+    """
+    # Private Instance Attributes:
+    #   - _executor:
+    #       The single worker thread that runs queries.
+    #   - _token:
+    #       The token of the last query submitted, or None if no query was submitted yet.
+    _executor: ThreadPoolExecutor
+    _token: Optional[CancelToken]
+
+    def __init__(self) -> None:
+        """Initialize a new QueryRunner.
+        """
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='query')
+        self._token = None
+
+    def submit(self, query: Callable[[CancelToken], Any]) -> Future:
+        """Cancel the last query submitted, and run query(token) once it has stopped.
+        Return the Future of the result of the query, which fails with QueryCancelled if it is superseded.
+
+        >>> runner = QueryRunner()
+        >>> runner.submit(lambda token: 1 + 1).result()
+        2
+        """
+        self.cancel()
+        token = CancelToken()
+        self._token = token
+        return self._executor.submit(_run, query, token)
+
+    def cancel(self) -> None:
+        """Cancel the last query submitted, if it has not finished.
+        """
+        if self._token is not None:
+            self._token.cancel()
+
+    def close(self) -> None:
+        """Cancel the last query submitted and stop the worker thread, without waiting for it.
+        """
+        self.cancel()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _run(query: Callable[[CancelToken], Any], token: CancelToken) -> Any:
+    """Return query(token), unless token was cancelled while the query was waiting for its turn.
+    """
+    token.raise_if_cancelled()
+    return query(token)
@@ -0,0 +1,157 @@
+"""This program contains the saved books of My Library Manager, which are kept between launches.
+
+Every change to the saved books is appended to a journal file, one line per change, so saving a book never
+rewrites the whole file. The saved books are restored at launch by reading the journal once from start to
+end, and the journal is compacted into one line per saved book when it grows much longer than that.
+"""
+from __future__ import annotations
+import os
+from typing import Any, Iterable, Optional
+from my_library_manager_data import Book
+
+# The journal is compacted once it has more than COMPACT_RATIO lines per saved book, and at least
+# MIN_COMPACT_LINES lines
+COMPACT_RATIO = 2
+MIN_COMPACT_LINES = 64
+
+
+class SavedBooks:
+    """Class that will keep the books in saved. Instances will be called on and mutated from different files.
+
+    Books are indexed by their GoodReads book_id, in the order they were saved.
+    If a journal file is given, the saved books are restored from it and every change is appended to it.
+
+    Representation Invariants:
+        - all(self._books[book_id].book_id == book_id for book_id in self._books)
+        - self._journal_lines >= len(self._books)
+
+    >>> b1 = Book('1', 'A', ['X'], set(), set(), 4.2, 10, 1, '', '2001', '', '', '11')
+    >>> b2 = Book('2', 'B', ['Y'], set(), set(), 3.9, 10, 2, '', '2002', '', '', '22')
+    >>> saved = SavedBooks()
+    >>> saved.add_book(b2)
+    >>> saved.add_book(b1)
+    >>> b1 in saved, [str(b) for b in saved.library], saved.version
+    (True, ['B', 'A'], 2)
+    """
+    # Instance Attributes:
+    #     - version: the number of times the saved books have changed, so that results computed from them can
+    #       tell when they are out of date
+    #     - library_scores: the similarity.LibraryScores kept up to date with the saved books, so that sorting
+    #       by similarity does not score every saved book again, or None
+    version: int
+    library_scores: Optional[Any]
+    # Private Instance Attributes:
+    #   - _books:
+    #       Maps the book_id of each saved book to the book, in the order they were saved.
+    #   - _journal_file:
+    #       The path of the journal, or None if the saved books are not kept between launches.
+    #   - _journal_lines:
+    #       The number of lines in the journal.
+    _books: dict[str, Book]
+    _journal_file: Optional[str]
+    _journal_lines: int
+
+    def __init__(self, library_scores: Optional[Any] = None, journal_file: Optional[str] = None,
+                 catalog: Iterable[Book] = ()) -> None:
+        """Initialize the saved books, restoring them from journal_file if it exists.
+        Journal lines are resolved to the books of catalog by book_id; books no longer in catalog are dropped.
+
+        Preconditions:
+            - the books in catalog have distinct book ids
+        """
+        self._books = {}
+        self._journal_file = journal_file
+        self._journal_lines = 0
+        self.version = 0
+        self.library_scores = library_scores
+
+        if journal_file is not None and os.path.dirname(journal_file):
+            os.makedirs(os.path.dirname(journal_file), exist_ok=True)
+        if journal_file is not None and os.path.exists(journal_file):
+            self._replay(journal_file, {book.book_id: book for book in catalog})
+            if self.library_scores is not None:
+                self.library_scores.add_all(list(self._books.values()))
+            self._compact_if_needed()
+
+    def __contains__(self, book: Book) -> bool:
+        """Return whether book is saved.
+        """
+        return self._books.get(book.book_id) is book
+
+    def __len__(self) -> int:
+        """Return the number of saved books.
+        """
+        return len(self._books)
+
+    @property
+    def library(self) -> list[Book]:
+        """A new list of the saved books, in the order they were saved.
+        """
+        return list(self._books.values())
+
+    def add_book(self, book: Book) -> None:
+        """Save book, unless it is already saved.
+        """
+        if book.book_id not in self._books:
+            self._books[book.book_id] = book
+            self.version += 1
+            if self.library_scores is not None:
+                self.library_scores.add(book)
+            self._append('+', book.book_id)
+
+    def remove_book(self, book: Book) -> None:
+        """Remove book from the saved books.
+        Raise ValueError if book is not saved.
+        """
+        if book not in self:
+            raise ValueError(f"{book} is not saved")
+        del self._books[book.book_id]
+        self.version += 1
+        if self.library_scores is not None:
+            self.library_scores.remove(book)
+        self._append('-', book.book_id)
+
+    def _replay(self, journal_file: str, books_by_id: dict[str, Book]) -> None:
+        """Restore the saved books from the changes in journal_file, in one read of the file.
+        A partly written last line, left by a crash, is ignored.
+        """
+        with open(journal_file, 'r', encoding='utf-8') as file:
+            lines = file.read().split('\n')
+
+        # The part after the last newline is empty unless the last write was cut short
+        for line in lines[:-1]:
+            self._journal_lines += 1
+            change, book_id = line[:1], line[1:]
+            if change == '+' and book_id in books_by_id and book_id not in self._books:
+                self._books[book_id] = books_by_id[book_id]
+            elif change == '-':
+                self._books.pop(book_id, None)
+
+        if lines[-1]:
+            # Rewrite the journal so that new lines are not appended to the partial one
+            self._compact()
+
+    def _append(self, change: str, book_id: str) -> None:
+        """Append a change to the journal, then compact it if it has grown too long.
+        """
+        if self._journal_file is None:
+            return
+        with open(self._journal_file, 'a', encoding='utf-8') as file:
+            file.write(f'{change}{book_id}\n')
+        self._journal_lines += 1
+        self._compact_if_needed()
+
+    def _compact_if_needed(self) -> None:
+        """Compact the journal if it has more than COMPACT_RATIO lines per saved book.
+        """
+        if self._journal_lines > max(MIN_COMPACT_LINES, COMPACT_RATIO * len(self._books)):
+            self._compact()
+
+    def _compact(self) -> None:
+        """Replace the journal with one line per saved book, in the order they were saved.
+        """
+        temporary_path = self._journal_file + '.tmp'
+        with open(temporary_path, 'w', encoding='utf-8') as file:
+            file.writelines(f'+{book_id}\n' for book_id in self._books)
+        os.replace(temporary_path, self._journal_file)
+        self._journal_lines = len(self._books)
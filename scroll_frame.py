@@ -2,76 +2,226 @@
 
 Copyright 2024 Areesha Abidi
 """ 
+import math
 import tkinter as tk
 from tkinter import Scrollbar
-from PIL import Image, ImageTk
-import requests
-from io import BytesIO
-from bookpage import create_book_page
+from bookpage import create_book_page, cover_loader, show_image
+from cover_cache import LIST_COVER_SIZE
+from tracing import traced
+
+# Set to False to create the widgets of every book in a ScrollingFrame, instead of only those of the rows in view
+VIRTUAL_SCROLLING = True
+# The number of books in each row, and the space each book takes on the page, in pixels
+COLUMNS = 4
+TILE_WIDTH = 175
+TILE_HEIGHT = 235
+# The number of rows above and below the ones in view that are also shown, so that they are ready when scrolled to
+OVERSCAN_ROWS = 2
 
 
 class ScrollingFrame(tk.Frame):
     """Creates a scrollable frame that will display books"""
-    def __init__(self, master, books):
+    def __init__(self, master, books, total=None, fetch_books=None):
+        """ When VIRTUAL_SCROLLING is True, only the rows of books in view have widgets, which are reused for
+        other books as the page is scrolled, so the first books show up right away however many there are.
+        If fetch_books is given, books are only the first of total books: fetch_books(self, offset) is called when
+        the books from offset are scrolled to, and must pass them to add_books once they are fetched"""
         super().__init__(master)
 
         self.canvas = tk.Canvas(self, width=700, height=700, highlightthickness=0)
         self.canvas.grid(row=0, column=0, sticky="nse", padx=1, pady=1)
 
-        self.frame = tk.Frame(self.canvas)
-        self.canvas.create_window((0, 0), window=self.frame, anchor="nw")
-
         self.scrollbar = Scrollbar(self, orient=tk.VERTICAL, command=self.canvas.yview)
         self.scrollbar.grid(row=0, column=1, sticky="ns")
-        self.canvas.configure(yscrollcommand=self.scrollbar.set)
-
-        self.frame.bind("<Configure>", self.on_frame_configure)
 
         self.images = []
         self.labels = []
-
-        self.host_images(books)
+        # The covers that are still being loaded
+        self.pending_covers = []
+
+        # The books are copied when more are fetched, since they are added to the list
+        self.books = list(books) if fetch_books is not None else books
+        self.total = len(books) if total is None else total
+        self.fetch_books = fetch_books
+        # Whether more books are being fetched
+        self.fetching = False
+
+        if VIRTUAL_SCROLLING:
+            # Maps the index of each book in view to the tile showing it, and the tiles not showing any book
+            self.tiles = {}
+            self.free_tiles = []
+
+            # The scroll region is the size of the whole list, so the scrollbar reflects every book
+            rows = math.ceil(self.total / COLUMNS)
+            self.canvas.configure(scrollregion=(0, 0, COLUMNS * TILE_WIDTH, rows * TILE_HEIGHT),
+                                  yscrollcommand=self.on_scroll)
+            self.canvas.bind("<Configure>", lambda event: self.show_visible_rows())
+            self.show_visible_rows()
+        else:
+            self.frame = tk.Frame(self.canvas)
+            self.canvas.create_window((0, 0), window=self.frame, anchor="nw")
+            self.canvas.configure(yscrollcommand=self.scrollbar.set)
+            self.frame.bind("<Configure>", self.on_frame_configure)
+
+            self.host_images(self.books)
+            # Without virtual scrolling, every book is placed, so fetch them all
+            self.fetch_more()
+
+    def destroy(self) -> None:
+        """ Stops loading the covers of the books before destroying the frame"""
+        for future in self.pending_covers:
+            future.cancel()
+        if VIRTUAL_SCROLLING:
+            for tile in self.tiles.values():
+                tile.clear()
+        super().destroy()
+
+    def on_scroll(self, first, last) -> None:
+        """ Command. Moves the scrollbar and shows the books scrolled to"""
+        self.scrollbar.set(first, last)
+        self.show_visible_rows()
+
+    def show_visible_rows(self) -> None:
+        """ Shows the books of the rows in view and the OVERSCAN_ROWS rows around them, reusing the tiles of the
+        books that are no longer in view"""
+        top = self.canvas.canvasy(0)
+        height = max(self.canvas.winfo_height(), int(self.canvas.cget("height")))
+        first_row = max(0, int(top // TILE_HEIGHT) - OVERSCAN_ROWS)
+        last_row = int((top + height) // TILE_HEIGHT) + OVERSCAN_ROWS
+        visible = range(first_row * COLUMNS, min(len(self.books), (last_row + 1) * COLUMNS))
+
+        for index in [index for index in self.tiles if index not in visible]:
+            tile = self.tiles.pop(index)
+            tile.clear()
+            self.free_tiles.append(tile)
+
+        for index in visible:
+            if index not in self.tiles:
+                tile = self.free_tiles.pop() if self.free_tiles else BookTile(self)
+                tile.show(index, self.books[index])
+                self.tiles[index] = tile
+
+        if (last_row + 1) * COLUMNS > len(self.books):
+            self.fetch_more()
+
+    def fetch_more(self) -> None:
+        """ Asks fetch_books for the books after those of the frame, unless there are none or they are being
+        fetched"""
+        if self.fetch_books is not None and not self.fetching and len(self.books) < self.total:
+            self.fetching = True
+            self.fetch_books(self, len(self.books))
+
+    def add_books(self, offset, new_books) -> None:
+        """ Adds new_books, the books fetched by fetch_books(self, offset), after the books of the frame. new_books is
+        empty if they could not be fetched, and they are fetched again when scrolled to"""
+        self.fetching = False
+        if offset != len(self.books) or not new_books:
+            return
+        self.books.extend(new_books)
+
+        if VIRTUAL_SCROLLING:
+            self.show_visible_rows()
+        else:
+            for i in range(offset + 1, len(self.books) + 1):
+                self.host_image(i, self.books)
+            self.fetch_more()
 
     def on_frame_configure(self, event) -> None:
         self.canvas.configure(scrollregion=self.canvas.bbox("all"))
 
+    def show_cover(self, button, tk_image) -> None:
+        """ Shows the cover tk_image on button"""
+        show_image(button, tk_image)
+        # Store the Tkinter image object
+        self.images.append(tk_image)
+
     def open_new_page(self, image_index, sorted_books_frame2) -> None:
         """Command. Creates a new book page for each book displayed"""
         book = sorted_books_frame2[image_index - 1]
         create_book_page(book)
 
     def host_images(self, sorted_books_frame2) -> None:
-        """ Downloads and opens the image using the url links in the Book attributes. Places them on the frame"""
-        # Image URLs
-        image_links = [book.image_url for book in sorted_books_frame2]
-
-        for i, link in enumerate(image_links, start=1):
-            # Download image from URL using requests
-            response = requests.get(link)
-            # Open image using Pillow
-            image = Image.open(BytesIO(response.content))
-            # Resize image if necessary
-            image = image.resize((110, 150))
-            # Convert image to Tkinter-compatible format
-            tk_image = ImageTk.PhotoImage(image)
-            # Store the Tkinter image object
-            self.images.append(tk_image)
-
-            # Calculate row and column indices for placement
-            row = (i - 1) // 4
-            col = (i - 1) % 4
-
-            # Create label with image and text
-            label_frame = tk.Frame(self.frame)
-            label_frame.grid(row=row, column=col, padx=10, pady=10)  # Adjust padding as needed
-
-            button = tk.Button(label_frame, image=tk_image, command=lambda idx=i: self.open_new_page(idx,
-                                                                                                     sorted_books_frame2
-                                                                                                     ))
-            button.grid(row=0, column=0)
-
-            text_label = tk.Label(label_frame, text=f"{sorted_books_frame2[i - 1].title}", wraplength=150)
-            text_label.grid(row=1, column=0)
-
-            # Store the label
-            self.labels.append(label_frame)
+        """ Places the books on the frame, with placeholders that are replaced by their covers as they are
+        loaded from the url links in the Book attributes"""
+        for i in range(1, len(sorted_books_frame2) + 1):
+            self.host_image(i, sorted_books_frame2)
+
+    @traced()
+    def host_image(self, i, sorted_books_frame2) -> None:
+        """ Places the i-th book (starting from 1) of sorted_books_frame2 on the frame, and starts loading its cover"""
+        # Calculate row and column indices for placement
+        row = (i - 1) // 4
+        col = (i - 1) % 4
+
+        # Create label with image and text
+        label_frame = tk.Frame(self.frame)
+        label_frame.grid(row=row, column=col, padx=10, pady=10)  # Adjust padding as needed
+
+        button = tk.Button(label_frame, image=cover_loader.placeholder(*LIST_COVER_SIZE),
+                           command=lambda idx=i: self.open_new_page(idx, sorted_books_frame2))
+        button.grid(row=0, column=0)
+
+        # Show the cover in place of the placeholder once it is loaded
+        future = cover_loader.load(button, sorted_books_frame2[i - 1].image_url, *LIST_COVER_SIZE,
+                                   lambda tk_image: self.show_cover(button, tk_image))
+        if future is not None:
+            self.pending_covers.append(future)
+
+        text_label = tk.Label(label_frame, text=f"{sorted_books_frame2[i - 1].title}", wraplength=150)
+        text_label.grid(row=1, column=0)
+
+        # Store the label
+        self.labels.append(label_frame)
+
+
+class BookTile:
+    """ The widgets showing one book in a virtual ScrollingFrame. A tile is moved to other books as the frame is
+    scrolled, instead of creating new widgets"""
+    def __init__(self, scrolling_frame):
+        self.scrolling_frame = scrolling_frame
+        canvas = scrolling_frame.canvas
+
+        self.frame = tk.Frame(canvas)
+        self.button = tk.Button(self.frame, image=cover_loader.placeholder(*LIST_COVER_SIZE), command=self.open_page)
+        self.button.grid(row=0, column=0)
+        # Titles are shown on at most 3 lines, so that every tile has the same height
+        self.title_label = tk.Label(self.frame, wraplength=150, height=3)
+        self.title_label.grid(row=1, column=0)
+        self.window = canvas.create_window(0, 0, window=self.frame, anchor="n", state="hidden")
+
+        # The index of the book shown in the books of the scrolling frame, and the load of its cover
+        self.index = None
+        self.future = None
+
+    @traced()
+    def show(self, index, book) -> None:
+        """ Shows the book at index in the books of the scrolling frame, with a placeholder until its cover is
+        loaded"""
+        self.index = index
+        row, col = divmod(index, COLUMNS)
+        canvas = self.scrolling_frame.canvas
+        canvas.coords(self.window, col * TILE_WIDTH + TILE_WIDTH // 2, row * TILE_HEIGHT + 10)
+        canvas.itemconfigure(self.window, state="normal")
+
+        self.title_label.configure(text=book.title)
+        show_image(self.button, cover_loader.placeholder(*LIST_COVER_SIZE))
+        self.future = cover_loader.load(self.button, book.image_url, *LIST_COVER_SIZE,
+                                        lambda tk_image: self.show_cover(index, tk_image))
+
+    def show_cover(self, index, tk_image) -> None:
+        """ Shows the cover tk_image of the book at index, if the tile still shows it"""
+        if self.index == index:
+            show_image(self.button, tk_image)
+
+    def clear(self) -> None:
+        """ Hides the tile and stops loading its cover"""
+        if self.future is not None:
+            self.future.cancel()
+            self.future = None
+        self.index = None
+        self.scrolling_frame.canvas.itemconfigure(self.window, state="hidden")
+
+    def open_page(self) -> None:
+        """ Command. Creates a new book page for the book shown"""
+        if self.index is not None:
+            create_book_page(self.scrolling_frame.books[self.index])
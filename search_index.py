@@ -0,0 +1,315 @@
+"""This program contains the full-text search index of My Library Manager.
+
+The index maps every word of the titles, authors and descriptions of the books to the books that contain it,
+so that a search only looks at the books that contain the words of the query. Results are ranked with BM25,
+and the last word of a query also matches any word it is a prefix of, so partly typed words find books.
+"""
+from __future__ import annotations
+import re
+import math
+import heapq
+import threading
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+from typing import Collection, Iterable, Optional
+from my_library_manager_data import Book
+
+# The BM25 term frequency saturation and length normalization parameters
+K1 = 1.2
+B = 0.75
+
+# How many times a word counts in each field of a book, so that matches in titles rank higher than
+# matches in descriptions
+FIELD_WEIGHTS = {'title': 3, 'authors': 2, 'description': 1}
+
+# The maximum number of words that the last word of a query is expanded to when used as a prefix.
+# The words that appear in the most books are kept.
+MAX_PREFIX_EXPANSIONS = 64
+
+_WORD = re.compile(r"[^\W_]+")
+
+
+def tokenize(text: str) -> list[str]:
+    """Return the lowercase words of text.
+
+    >>> tokenize("The Hobbit, or There and Back Again")
+    ['the', 'hobbit', 'or', 'there', 'and', 'back', 'again']
+    """
+    return _WORD.findall(text.casefold())
+
+
+def rank(scores: dict[int, float], limit: Optional[int] = None) -> list[int]:
+    """Return the ids in scores from the highest to the lowest score, breaking ties by id.
+    If limit is not None, only the limit best ids are returned, which is faster than ranking them all.
+
+    >>> rank({3: 1.0, 1: 2.5, 2: 1.0}), rank({3: 1.0, 1: 2.5, 2: 1.0}, 2)
+    ([1, 2, 3], [1, 2])
+    """
+    if limit is not None and limit < len(scores):
+        return heapq.nsmallest(limit, scores, key=lambda book_id: (-scores[book_id], book_id))
+    return sorted(scores, key=lambda book_id: (-scores[book_id], book_id))
+
+
+class SearchIndex:
+    """An inverted index over the titles, authors and descriptions of books.
+
+    Representation Invariants:
+        - len(self._lengths) == len(self._books)
+        - all(len(self._postings[w][0]) == len(self._postings[w][1]) for w in self._postings)
+        - self._words == sorted(self._postings)
+    """
+    # Private Instance Attributes:
+    #   - _books:
+    #       The indexed books. The id of a book is its index in this list.
+    #   - _postings:
+    #       Maps each word to a pair of arrays: the increasing ids of the books that contain the word, and the
+    #       weighted number of times the word appears in each of these books.
+    #   - _lengths:
+    #       _lengths[i] is the weighted number of words of book i.
+    #   - _average_length:
+    #       The average of _lengths.
+    #   - _norms:
+    #       _norms[i] is the BM25 length normalization of book i, K1 * (1 - B + B * _lengths[i] / _average_length).
+    #   - _words:
+    #       The sorted list of the words in _postings, used to find the words that begin with a prefix.
+    _books: list[Book]
+    _postings: dict[str, tuple[array, array]]
+    _lengths: array
+    _average_length: float
+    _norms: array
+    _words: list[str]
+
+    def __init__(self, books: Iterable[Book], descriptions: Optional[Iterable[str]] = None) -> None:
+        """Initialize a new SearchIndex over the given books.
+        descriptions, if given, are the descriptions of the books in the same order. They are indexed instead of
+        book.description, which reads each lazy book back from the books data file.
+        """
+        self._books = list(books)
+        self._lengths = array('I')
+        postings = {}
+        if descriptions is None:
+            descriptions = (book.description for book in self._books)
+
+        for book_id, (book, description) in enumerate(zip(self._books, descriptions)):
+            counts = {}
+            fields = {'title': book.title, 'authors': ' '.join(book.authors), 'description': description}
+            for field, text in fields.items():
+                if text == "No information available":
+                    continue
+                for word in tokenize(text):
+                    counts[word] = counts.get(word, 0) + FIELD_WEIGHTS[field]
+
+            self._lengths.append(sum(counts.values()))
+            for word, count in counts.items():
+                if word not in postings:
+                    postings[word] = (array('I'), array('I'))
+                postings[word][0].append(book_id)
+                postings[word][1].append(count)
+
+        self._postings = postings
+        self._average_length = sum(self._lengths) / len(self._lengths) if self._lengths else 0.0
+        self._norms = array('d', [K1 * (1 - B + B * length / self._average_length) if self._average_length else K1
+                                  for length in self._lengths])
+        self._words = sorted(postings)
+
+    def search(self, query: str, limit: int | None = None) -> list[Book]:
+        """Return the books that contain every word of query, from the best to the worst match.
+        The last word of the query also matches the words it is a prefix of.
+        If limit is not None, at most limit books are returned.
+
+        >>> b1 = Book('1', 'The Hobbit', ['J.R.R. Tolkien'], set(), set(), 4.2, 10, 2, 'A hobbit goes on a quest.',
+        ...           '1937', '', '')
+        >>> b2 = Book('2', 'The Lord of the Rings', ['J.R.R. Tolkien'], set(), set(), 4.5, 10, 3,
+        ...           'Frodo and the hobbits.', '1954', '', '')
+        >>> index = SearchIndex([b1, b2])
+        >>> [str(b) for b in index.search('tolkien hobbit')]
+        ['The Hobbit', 'The Lord of the Rings']
+        >>> [str(b) for b in index.search('lord of the ri')]
+        ['The Lord of the Rings']
+        """
+        return self.books_of(self.search_ids(query, limit))
+
+    def search_ids(self, query: str, limit: Optional[int] = None) -> list[int]:
+        """Return the ids of the books that match query, as in search, from the best to the worst match.
+        If limit is not None, at most limit ids are returned.
+        """
+        return rank(self.scores(query), limit)
+
+    def scores(self, query: str, candidates: Optional[Collection[int]] = None) -> dict[int, float]:
+        """Return the score of each book that matches query, by book id.
+
+        candidates, if given, are the ids of a set of books that contains every match of query, such as
+        the matches of a query that query extends. They are searched instead of the whole index when they
+        are fewer than the books matched by any word of query.
+        """
+        words = tokenize(query)
+        if not words:
+            return {}
+
+        # Each group is the list of words that one query word matches
+        groups = [[word] for word in words[:-1] if word in self._postings]
+        if len(groups) < len(words) - 1:
+            return {}
+        groups.append(self._expand_prefix(words[-1]))
+        if not groups[-1]:
+            return {}
+
+        # Start from the group that matches the fewest books, so that the candidates shrink as fast as possible
+        sizes = {id(group): sum(len(self._postings[word][0]) for word in group) for group in groups}
+        groups.sort(key=lambda g: sizes[id(g)])
+        if candidates is not None and len(candidates) < sizes[id(groups[0])]:
+            scores = dict.fromkeys(candidates, 0.0)
+        else:
+            scores = self._group_scores(groups.pop(0), None)
+        for group in groups:
+            if not scores:
+                break
+            group_scores = self._group_scores(group, scores)
+            scores = {book_id: score + group_scores[book_id] for book_id, score in scores.items()
+                      if book_id in group_scores}
+        return scores
+
+    def books_of(self, book_ids: Iterable[int]) -> list[Book]:
+        """Return the books with the given ids.
+        """
+        return [self._books[book_id] for book_id in book_ids]
+
+    def expands_completely(self, prefix: str) -> bool:
+        """Return whether the last word of a query can be prefix matched with every indexed word that begins
+        with prefix, that is, whether at most MAX_PREFIX_EXPANSIONS words begin with prefix.
+        """
+        return len(self._words_with_prefix(prefix, MAX_PREFIX_EXPANSIONS + 1)) <= MAX_PREFIX_EXPANSIONS
+
+    def _expand_prefix(self, prefix: str) -> list[str]:
+        """Return the indexed words that begin with prefix, keeping the MAX_PREFIX_EXPANSIONS words that
+        appear in the most books.
+        """
+        matches = self._words_with_prefix(prefix)
+        if len(matches) > MAX_PREFIX_EXPANSIONS:
+            matches.sort(key=lambda word: -len(self._postings[word][0]))
+            matches = matches[:MAX_PREFIX_EXPANSIONS]
+        return matches
+
+    def _words_with_prefix(self, prefix: str, limit: Optional[int] = None) -> list[str]:
+        """Return the indexed words that begin with prefix, in sorted order, stopping after limit words.
+        """
+        start = bisect_left(self._words, prefix)
+        matches = []
+        for i in range(start, len(self._words)):
+            if not self._words[i].startswith(prefix) or len(matches) == limit:
+                break
+            matches.append(self._words[i])
+        return matches
+
+    def _group_scores(self, group: list[str], candidates: dict[int, float] | None) -> dict[int, float]:
+        """Return the BM25 score of each book that contains a word of group, which is the best score of
+        the words of group that it contains.
+        If candidates is not None, only the books in candidates are scored.
+        """
+        scores = {}
+        for word in group:
+            book_ids, counts = self._postings[word]
+            idf = math.log(1 + (len(self._books) - len(book_ids) + 0.5) / (len(book_ids) + 0.5))
+
+            if candidates is not None and len(candidates) * 16 < len(book_ids):
+                # Look the candidates up in the postings instead of going through all of them
+                pairs = []
+                for book_id in candidates:
+                    i = bisect_left(book_ids, book_id)
+                    if i < len(book_ids) and book_ids[i] == book_id:
+                        pairs.append((book_id, counts[i]))
+            else:
+                pairs = zip(book_ids, counts)
+
+            norms = self._norms
+            for book_id, count in pairs:
+                if candidates is not None and book_id not in candidates:
+                    continue
+                score = idf * count * (K1 + 1) / (count + norms[book_id])
+                if score > scores.get(book_id, 0.0):
+                    scores[book_id] = score
+        return scores
+
+
+class LiveSearch:
+    """Searches a SearchIndex as the user types, caching the results of recent queries.
+
+    Adding characters to the end of a query can only remove matches: the words before the last one must
+    still match, and the last word becomes longer or is followed by more words. So when a query extends a
+    cached query, only the cached results of that query are searched instead of the whole index.
+    This does not hold when the last word of the cached query is a prefix of more than MAX_PREFIX_EXPANSIONS
+    words, since only some of them were matched, so the matches of such queries are never narrowed down.
+    This may be used from several threads.
+
+    Representation Invariants:
+        - len(self._cache) <= self._cache_size
+    """
+    # Private Instance Attributes:
+    #   - _index:
+    #       The index that is searched.
+    #   - _cache_size:
+    #       The maximum number of queries whose results are cached.
+    #   - _cache:
+    #       Maps each recent normalized query to the scores of its matches by book id, and whether they can
+    #       be narrowed down, from least to most recently used.
+    #   - hits:
+    #       The number of searches answered from the cache, either exactly or by narrowing cached results.
+    #   - misses:
+    #       The number of searches that searched the whole index.
+    #   - _lock:
+    #       The lock held while searching, since searches read and change _cache.
+    _index: SearchIndex
+    _cache_size: int
+    _cache: OrderedDict[str, tuple[dict[int, float], bool]]
+    hits: int
+    misses: int
+    _lock: threading.Lock
+
+    def __init__(self, index: SearchIndex, cache_size: int = 64) -> None:
+        """Initialize a new LiveSearch over index.
+        """
+        self._index = index
+        self._cache_size = cache_size
+        self._cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def search(self, query: str, limit: Optional[int] = None) -> list[Book]:
+        """Return the books that match query, as in SearchIndex.search.
+        If limit is not None, at most limit books are returned.
+
+        >>> b1 = Book('1', 'The Hobbit', ['J.R.R. Tolkien'], set(), set(), 4.2, 10, 2, '', '1937', '', '')
+        >>> b2 = Book('2', 'The Lord of the Rings', ['Tolkien'], set(), set(), 4.5, 10, 3, '', '1954', '', '')
+        >>> live = LiveSearch(SearchIndex([b1, b2]))
+        >>> [str(b) for b in live.search('tol')], [str(b) for b in live.search('tolkien ho')]
+        (['The Hobbit', 'The Lord of the Rings'], ['The Hobbit'])
+        >>> live.hits, live.misses
+        (1, 1)
+        """
+        with self._lock:
+            query = ' '.join(tokenize(query)) + (' ' if query[-1:].isspace() else '')
+            if query in self._cache:
+                self.hits += 1
+                self._cache.move_to_end(query)
+                return self._index.books_of(rank(self._cache[query][0], limit))
+
+            # Narrow down the matches of the longest cached query that this query extends
+            narrowed = ''
+            for cached_query, (_, narrowable) in self._cache.items():
+                if narrowable and len(cached_query) > len(narrowed) and query.startswith(cached_query):
+                    narrowed = cached_query
+
+            if narrowed:
+                self.hits += 1
+                scores = self._index.scores(query, self._cache[narrowed][0])
+            else:
+                self.misses += 1
+                scores = self._index.scores(query)
+
+            words = tokenize(query)
+            self._cache[query] = (scores, not words or self._index.expands_completely(words[-1]))
+            if len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+            return self._index.books_of(rank(scores, limit))
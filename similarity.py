@@ -0,0 +1,319 @@
+"""This program contains a similarity engine that ranks books by their average similarity to a library,
+using sparse matrices instead of comparing the shelves of every pair of books one at a time.
+"""
+from __future__ import annotations
+import threading
+from typing import Any, Optional
+import numpy as np
+from scipy import sparse
+from my_library_manager_data import Book, shelf_vocabulary
+
+# The number of candidate books whose scores are computed in one batch, which bounds the size of
+# the dense candidates x library matrices built while scoring
+CHUNK_SIZE = 4096
+
+
+class SimilarityEngine:
+    """A similarity engine over a catalog of books.
+
+    Every book is encoded as a row of a sparse binary matrix with one column per shelf in shelf_vocabulary,
+    where entry (i, j) is 1 if and only if shelf j is a tag or genre of book i. The number of common shelves
+    between every candidate and every book of a library is then one sparse matrix product, from which
+    the scores of Book.similarity_score follow.
+
+    Representation Invariants:
+        - self._matrix.shape[0] == len(self._books)
+        - all(self._rows[book] == i for i, book in enumerate(self._books))
+    """
+    # Private Instance Attributes:
+    #   - _books:
+    #       The books of the catalog. The row of a book in the matrix is its index in this list.
+    #   - _rows:
+    #       Maps each book of the catalog to its row.
+    #   - _matrix:
+    #       The sparse binary matrix of the shelves of every book in the catalog.
+    #   - _sizes:
+    #       _sizes[i] is the number of shelves of the book in row i.
+    #   - _has_tags:
+    #       _has_tags[i] is whether the book in row i has any tags. Books without tags have a
+    #       similarity score of 0.0 to every book.
+    #   - _library_scores:
+    #       The running score sums of the library tracked by track_library, or None if no library is tracked.
+    _books: list[Book]
+    _rows: dict[Book, int]
+    _matrix: sparse.csr_matrix
+    _sizes: np.ndarray
+    _has_tags: np.ndarray
+    _library_scores: Optional[LibraryScores]
+
+    def __init__(self, books: list[Book]) -> None:
+        """Initialize a new SimilarityEngine over the given books.
+        """
+        self._books = list(books)
+        self._rows = {book: i for i, book in enumerate(self._books)}
+        self._matrix, self._sizes, self._has_tags = encode_shelves(self._books)
+        self._library_scores = None
+
+    def __contains__(self, book: Book) -> bool:
+        """Return whether book is in the catalog of this engine.
+        """
+        return book in self._rows
+
+    def average_similarity_scores(self, book_list: list[Book], library: list[Book],
+                                  cancel_token: Optional[Any] = None) -> np.ndarray:
+        """Return the average similarity score of every book in book_list to all the books in the library,
+        in the same order as book_list. Each score is equal to book.average_similarity_score(library).
+        If cancel_token is given, its raise_if_cancelled() method is called before each chunk of books is scored.
+
+        >>> b1 = Book('1', 'A', ['X'], {'poetry'}, {'to-read', 'poems'}, 4.2, 10, 1, '', '2001', '', '')
+        >>> b2 = Book('2', 'B', ['Y'], {'poetry', 'romance'}, {'to-read'}, 3.9, 10, 2, '', '2002', '', '')
+        >>> b3 = Book('3', 'C', ['Z'], {'romance'}, set(), 3.9, 10, 2, '', '2002', '', '')
+        >>> engine = SimilarityEngine([b1, b2, b3])
+        >>> engine.average_similarity_scores([b1, b3], [b2, b1]).tolist()
+        [0.75, 0.0]
+        """
+        scores = np.zeros(len(book_list))
+        if not book_list or not library:
+            return scores
+
+        library_matrix, library_sizes, library_has_tags = self._rows_of(library)
+
+        for start in range(0, len(book_list), CHUNK_SIZE):
+            if cancel_token is not None:
+                cancel_token.raise_if_cancelled()
+            matrix, sizes, has_tags = self._rows_of(book_list[start:start + CHUNK_SIZE])
+
+            ratios = pairwise_scores(matrix, sizes, has_tags, library_matrix, library_sizes, library_has_tags)
+
+            # Add the scores one library book at a time, in the same order as Book.average_similarity_score,
+            # so that the sums are exactly the same
+            chunk_scores = np.zeros(len(sizes))
+            for j in range(ratios.shape[1]):
+                chunk_scores += ratios[:, j]
+            scores[start:start + len(sizes)] = chunk_scores / len(library)
+
+        return scores
+
+    def sort_by_similarity(self, book_list: list[Book], library: list[Book],
+                           cancel_token: Optional[Any] = None) -> None:
+        """Sort book list by descending average similarity to books in the library.
+        Books in the library are removed from book_list, and books with the same score keep their order,
+        exactly like my_library_manager_data.sort_by_similarity.
+        This method mutates book_list. If cancel_token is given, it is checked as in average_similarity_scores.
+        """
+        candidates, scores = self._library_similarity(book_list, library, cancel_token)
+        order = np.argsort(-scores, kind='stable')
+        book_list[:] = [candidates[i] for i in order.tolist()]
+
+    def first_by_similarity(self, book_list: list[Book], library: list[Book], k: int,
+                            cancel_token: Optional[Any] = None) -> list[Book]:
+        """Return the first k books of book_list sorted by similarity to the library, as sort_by_similarity
+        would sort them, without sorting the others. book_list is not mutated.
+        """
+        candidates, scores = self._library_similarity(book_list, library, cancel_token)
+        k = min(k, len(candidates))
+        if k <= 0:
+            return []
+        return [candidates[i] for i in top_k(scores, k).tolist()]
+
+    def _library_similarity(self, book_list: list[Book], library: list[Book],
+                            cancel_token: Optional[Any] = None) -> tuple[list[Book], np.ndarray]:
+        """Return the books of book_list that are not in the library, and their average similarity scores
+        to the library.
+        """
+        saved = {id(book) for book in library}
+        candidates = [book for book in book_list if id(book) not in saved]
+
+        sums = self._library_scores.sums_for(library) if self._library_scores is not None else None
+        if sums is not None and library and all(book in self._rows for book in candidates):
+            # The library is tracked, so its scores are already summed
+            rows = np.fromiter((self._rows[book] for book in candidates), dtype=np.int64, count=len(candidates))
+            return candidates, sums[rows] / len(library)
+        return candidates, self.average_similarity_scores(candidates, library, cancel_token)
+
+    def track_library(self) -> LibraryScores:
+        """Return new running score sums for an empty library, which sort_by_similarity uses instead of
+        scoring the library again whenever it is sorting by similarity to the same books.
+        Only the last library returned is used.
+        """
+        self._library_scores = LibraryScores(self)
+        return self._library_scores
+
+    def most_similar(self, book: Book, k: int) -> list[Book]:
+        """Return the k books of the catalog that are most similar to book, from most to least similar.
+        book itself is never returned, and books with the same score are returned in catalog order, so the
+        result is the same as the first k books of the catalog sorted by similarity to [book].
+        Neither the catalog nor any other list is mutated.
+
+        >>> b1 = Book('1', 'A', ['X'], {'poetry'}, {'to-read', 'poems'}, 4.2, 10, 1, '', '2001', '', '')
+        >>> b2 = Book('2', 'B', ['Y'], {'poetry', 'romance'}, {'to-read'}, 3.9, 10, 2, '', '2002', '', '')
+        >>> b3 = Book('3', 'C', ['Z'], {'romance'}, {'to-read'}, 3.9, 10, 2, '', '2002', '', '')
+        >>> [str(b) for b in SimilarityEngine([b1, b2, b3]).most_similar(b2, 5)]
+        ['C', 'A']
+        """
+        scores = self._scores_to(book)
+        if book in self._rows:
+            scores[self._rows[book]] = -np.inf
+        k = min(k, len(self._books) - (book in self._rows))
+        if k <= 0:
+            return []
+
+        return [self._books[i] for i in top_k(scores, k).tolist()]
+
+    def _scores_to(self, book: Book) -> np.ndarray:
+        """Return the similarity score of every book in the catalog to book, in catalog order.
+        """
+        matrix, sizes, has_tags = self._rows_of([book])
+        return pairwise_scores(self._matrix, self._sizes, self._has_tags, matrix, sizes, has_tags).ravel()
+
+    def _rows_of(self, books: list[Book]) -> tuple[sparse.csr_matrix, np.ndarray, np.ndarray]:
+        """Return the matrix, sizes and has_tags rows of the given books.
+        Books that are not in the catalog are encoded on the spot.
+        """
+        if all(book in self._rows for book in books):
+            rows = np.fromiter((self._rows[book] for book in books), dtype=np.int64, count=len(books))
+            matrix = self._matrix[rows]
+            if matrix.shape[1] < len(shelf_vocabulary):
+                matrix.resize((len(books), len(shelf_vocabulary)))
+            return matrix, self._sizes[rows], self._has_tags[rows]
+        else:
+            return encode_shelves(books)
+
+
+class LibraryScores:
+    """The sum of the similarity scores of every book in the catalog of a SimilarityEngine to the books of a
+    library, kept up to date as books are added to and removed from the library.
+
+    Adding or removing a book only scores the catalog against that book, instead of against the whole
+    library. Scores are added in the order books are added, exactly as average_similarity_scores adds them,
+    so sorting by these sums gives the same order as scoring the library again. Removing a book subtracts
+    its scores, after which the sums may differ from a full rescoring in their last bits, so books whose
+    scores are equal may end up in a different order.
+    This may be used from several threads.
+
+    Representation Invariants:
+        - self._sums.shape == (len(self._engine._books),)
+    """
+    # Private Instance Attributes:
+    #   - _engine:
+    #       The engine whose catalog is scored.
+    #   - _sums:
+    #       _sums[i] is the sum of the similarity scores of the book in row i to every book of the library.
+    #   - _library:
+    #       Maps the id of each book of the library to the book.
+    #   - _lock:
+    #       The lock held while reading or changing _sums and _library.
+    _engine: SimilarityEngine
+    _sums: np.ndarray
+    _library: dict[int, Book]
+    _lock: threading.Lock
+
+    def __init__(self, engine: SimilarityEngine) -> None:
+        """Initialize the score sums of an empty library over the catalog of engine.
+        """
+        self._engine = engine
+        self._sums = np.zeros(len(engine._books))
+        self._library = {}
+        self._lock = threading.Lock()
+
+    def add(self, book: Book) -> None:
+        """Add book to the library.
+
+        Preconditions:
+            - book is not in the library
+        """
+        scores = self._engine._scores_to(book)
+        with self._lock:
+            self._sums += scores
+            self._library[id(book)] = book
+
+    def add_all(self, books: list[Book]) -> None:
+        """Add books to the library, in order, with the same sums as adding them one at a time.
+
+        Preconditions:
+            - no book of books is in the library, and books has no duplicates
+        """
+        # Score the catalog against a few books at a time, which bounds the dense matrix to about CHUNK_SIZE
+        # entries per book of the catalog
+        chunk_size = max(1, CHUNK_SIZE * CHUNK_SIZE // max(1, len(self._engine._books)))
+        for start in range(0, len(books), chunk_size):
+            chunk = books[start:start + chunk_size]
+            matrix, sizes, has_tags = self._engine._rows_of(chunk)
+            ratios = pairwise_scores(self._engine._matrix, self._engine._sizes, self._engine._has_tags,
+                                     matrix, sizes, has_tags)
+            with self._lock:
+                for j, book in enumerate(chunk):
+                    self._sums += ratios[:, j]
+                    self._library[id(book)] = book
+
+    def remove(self, book: Book) -> None:
+        """Remove book from the library.
+
+        Preconditions:
+            - book is in the library
+        """
+        scores = self._engine._scores_to(book)
+        with self._lock:
+            self._sums -= scores
+            del self._library[id(book)]
+
+    def sums_for(self, library: list[Book]) -> Optional[np.ndarray]:
+        """Return a copy of the score sums if library holds the same books as the tracked library,
+        and None otherwise.
+        """
+        with self._lock:
+            if len(library) == len(self._library) and all(id(book) in self._library for book in library):
+                return self._sums.copy()
+            return None
+
+
+def pairwise_scores(matrix: sparse.csr_matrix, sizes: np.ndarray, has_tags: np.ndarray,
+                    other_matrix: sparse.csr_matrix, other_sizes: np.ndarray,
+                    other_has_tags: np.ndarray) -> np.ndarray:
+    """Return the dense array of similarity scores between two groups of books encoded by encode_shelves,
+    where entry (i, j) is the score between book i of the first group and book j of the second group.
+    """
+    common = (matrix @ other_matrix.T).toarray().astype(np.float64)
+    total = sizes[:, None] + other_sizes[None, :] - common
+    scores = np.divide(common, total, out=np.zeros_like(common), where=total > 0)
+    scores[~has_tags, :] = 0.0
+    scores[:, ~other_has_tags] = 0.0
+    return scores
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Return the indices of the k largest scores, from largest to smallest score.
+    Equal scores are ordered by index, like a stable sort in decreasing order would.
+
+    Preconditions:
+        - 0 < k <= len(scores)
+
+    >>> top_k(np.array([0.5, 0.9, 0.5, 0.1, 0.5]), 3).tolist()
+    [1, 0, 2]
+    """
+    # The k-th largest score, found by a partial selection instead of a full sort
+    threshold = np.partition(scores, len(scores) - k)[len(scores) - k]
+    above = np.flatnonzero(scores > threshold)
+    tied = np.flatnonzero(scores == threshold)[:k - len(above)]
+    chosen = np.concatenate((above, tied))
+    return chosen[np.lexsort((chosen, -scores[chosen]))]
+
+
+def encode_shelves(books: list[Book]) -> tuple[sparse.csr_matrix, np.ndarray, np.ndarray]:
+    """Return the sparse binary matrix of the shelves of the given books, the number of shelves of each book
+    and whether each book has tags.
+    """
+    indptr = [0]
+    indices = []
+    has_tags = []
+    for book in books:
+        shelves = book.tag_ids | book.genre_ids
+        indices.extend(shelves)
+        indptr.append(len(indices))
+        has_tags.append(len(book.tag_ids) != 0)
+
+    data = np.ones(len(indices), dtype=np.int32)
+    matrix = sparse.csr_matrix((data, np.array(indices, dtype=np.int64), np.array(indptr, dtype=np.int64)),
+                               shape=(len(books), len(shelf_vocabulary)))
+    sizes = np.diff(matrix.indptr).astype(np.float64)
+    return matrix, sizes, np.array(has_tags, dtype=bool)
@@ -0,0 +1,94 @@
+"""This program saves the catalog built from the GoodReads data files to a binary snapshot, so that later
+launches can load it in one read instead of parsing the JSON files and rebuilding the tree again.
+
+A snapshot is invalidated automatically when any source file changes size or modification time
+(and, optionally, contents), or when SNAPSHOT_VERSION changes.
+"""
+from __future__ import annotations
+import os
+import pickle
+import hashlib
+from typing import Any, Optional
+from my_library_manager_data import shelf_vocabulary
+
+# Increase this whenever the classes stored in a snapshot change, so that old snapshots are not loaded
+SNAPSHOT_VERSION = 8
+
+
+def source_fingerprint(source_files: list[str], with_hash: bool = False) -> dict[str, list]:
+    """Return the size and modification time of each source file, which change whenever a file is rewritten.
+    If with_hash is True, the BLAKE2 hash of the contents of each file is included as well.
+    """
+    fingerprint = {}
+    for path in source_files:
+        stat = os.stat(path)
+        fingerprint[os.path.abspath(path)] = [stat.st_size, stat.st_mtime_ns]
+        if with_hash:
+            fingerprint[os.path.abspath(path)].append(_file_hash(path))
+    return fingerprint
+
+
+def save_snapshot(path: str, source_files: list[str], catalog: dict[str, Any], with_hash: bool = False,
+                  options: Optional[dict[str, Any]] = None) -> bool:
+    """Save catalog, a mapping of names to the data structures built from source_files, to the snapshot at path.
+    shelf_vocabulary is saved along with it, since the genres and tags of the books are stored as its ids.
+    options are the settings the catalog was built with. The snapshot is only loaded with the same options.
+
+    Return whether the snapshot was saved. If the catalog cannot be pickled, for example because it holds
+    structures too deep for the recursion limit, or the file cannot be written, no partial file is left behind
+    and the catalog is simply built from the source files again on the next launch.
+    """
+    metadata = _metadata(source_files, with_hash, options)
+
+    temporary_path = path + '.tmp'
+    try:
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(temporary_path, 'wb') as file:
+            # The metadata is pickled on its own so that it can be checked without loading the catalog
+            pickle.dump(metadata, file, protocol=pickle.HIGHEST_PROTOCOL)
+            pickle.dump((shelf_vocabulary, catalog), file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temporary_path, path)
+    except (OSError, RecursionError, pickle.PicklingError, TypeError, AttributeError):
+        if os.path.exists(temporary_path):
+            os.remove(temporary_path)
+        return False
+    return True
+
+
+def load_snapshot(path: str, source_files: list[str], with_hash: bool = False,
+                  options: Optional[dict[str, Any]] = None) -> Optional[dict[str, Any]]:
+    """Return the catalog saved in the snapshot at path, or None if there is no snapshot or it is out of date.
+    Loading a snapshot replaces the contents of shelf_vocabulary with the vocabulary saved in it.
+
+    Preconditions:
+        - no Book has been created yet in this process
+    """
+    try:
+        with open(path, 'rb') as file:
+            metadata = pickle.load(file)
+            if metadata != _metadata(source_files, with_hash, options):
+                return None
+            vocabulary, catalog = pickle.loads(file.read())
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ValueError):
+        return None
+
+    shelf_vocabulary.restore(vocabulary)
+    return catalog
+
+
+def _metadata(source_files: list[str], with_hash: bool, options: Optional[dict[str, Any]]) -> dict[str, Any]:
+    """Return the metadata of a snapshot of the given source files, built with the given options.
+    """
+    return {'version': SNAPSHOT_VERSION, 'sources': source_fingerprint(source_files, with_hash),
+            'options': options or {}}
+
+
+def _file_hash(path: str) -> str:
+    """Return the hexadecimal BLAKE2 hash of the contents of the file at path.
+    """
+    digest = hashlib.blake2b()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
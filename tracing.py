@@ -0,0 +1,177 @@
+"""This program records where the time of My Library Manager goes, as spans around the steps of its hot paths:
+loading the data files, building the tree, filtering and sorting books, placing them on pages and loading
+their covers.
+
+Tracing is off unless the MY_LIBRARY_MANAGER_TRACE environment variable is set to 1 before the program starts.
+When it is off, functions decorated with traced are left as they are, so tracing costs nothing.
+When it is on, the last spans are kept in a ring buffer in memory, which can be written as a Chrome trace
+(opened with chrome://tracing or https://ui.perfetto.dev) and summarized by the median and 95th percentile
+duration of each span.
+"""
+from __future__ import annotations
+import os
+import json
+import time
+import threading
+import functools
+from collections import deque
+from contextlib import contextmanager, nullcontext
+from typing import Any, Callable, ContextManager, Iterator, Optional
+
+# Whether spans are recorded, which is decided once when the program starts
+ENABLED = os.environ.get('MY_LIBRARY_MANAGER_TRACE', '') == '1'
+
+# The number of spans kept. Older spans are dropped past it
+DEFAULT_CAPACITY = 100_000
+
+
+class Tracer:
+    """A ring buffer of the last spans recorded, from any thread.
+
+    >>> tracer = Tracer(capacity=2)
+    >>> for duration in (10, 20, 30):
+    ...     tracer.record('step', 0, duration * 1000)
+    >>> tracer.summary()['step']['count'], tracer.summary()['step']['p50_ms']
+    (2, 0.02)
+    """
+    # Private Instance Attributes:
+    #   - _spans:
+    #       The last spans recorded, as (name, start, end, thread id, args) tuples, where start and end are
+    #       time.perf_counter_ns() values.
+    #   - _thread_names:
+    #       Maps the id of each thread that recorded a span to its name.
+    _spans: deque[tuple[str, int, int, int, Optional[dict]]]
+    _thread_names: dict[int, str]
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY) -> None:
+        """Initialize a new Tracer that keeps the last capacity spans.
+        """
+        self._spans = deque(maxlen=capacity)
+        self._thread_names = {}
+
+    def record(self, name: str, start: int, end: int, args: Optional[dict] = None) -> None:
+        """Record a span called name that went from start to end, in nanoseconds of time.perf_counter_ns(),
+        in the current thread, with args describing it.
+        """
+        thread_id = threading.get_ident()
+        if thread_id not in self._thread_names:
+            self._thread_names[thread_id] = threading.current_thread().name
+        # Appending to a deque is atomic, so threads do not need a lock
+        self._spans.append((name, start, end, thread_id, args))
+
+    def clear(self) -> None:
+        """Drop every span recorded.
+        """
+        self._spans.clear()
+
+    def chrome_trace(self) -> dict[str, Any]:
+        """Return the spans recorded in the Chrome trace event format.
+        """
+        pid = os.getpid()
+        # Metadata events that name the threads
+        events = [{'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': thread_id, 'args': {'name': thread_name}}
+                  for thread_id, thread_name in list(self._thread_names.items())]
+        for name, start, end, thread_id, args in list(self._spans):
+            event = {'name': name, 'cat': 'my_library_manager', 'ph': 'X', 'pid': pid, 'tid': thread_id,
+                     'ts': start / 1000, 'dur': (end - start) / 1000}
+            if args:
+                event['args'] = {key: str(value) for key, value in args.items()}
+            events.append(event)
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def dump(self, path: str) -> None:
+        """Write the spans recorded to path as a Chrome trace.
+        """
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as file:
+            json.dump(self.chrome_trace(), file)
+
+    def summary(self) -> dict[str, dict[str, float]]:
+        """Return the number of spans of each name recorded, and their total, median (p50), 95th percentile (p95)
+        and maximum durations in milliseconds.
+        """
+        durations = {}
+        for name, start, end, _, _ in list(self._spans):
+            durations.setdefault(name, []).append((end - start) / 1_000_000)
+
+        result = {}
+        for name, times in durations.items():
+            times.sort()
+            result[name] = {'count': len(times), 'total_ms': sum(times), 'p50_ms': _percentile(times, 50),
+                            'p95_ms': _percentile(times, 95), 'max_ms': times[-1]}
+        return result
+
+    def format_summary(self) -> str:
+        """Return the summary as a table, from the span with the largest total duration to the smallest.
+        """
+        rows = sorted(self.summary().items(), key=lambda item: item[1]['total_ms'], reverse=True)
+        lines = [f"{'span':<32} {'count':>8} {'total ms':>12} {'p50 ms':>10} {'p95 ms':>10} {'max ms':>10}"]
+        for name, stats in rows:
+            lines.append(f"{name:<32} {stats['count']:>8} {stats['total_ms']:>12.2f} {stats['p50_ms']:>10.3f} "
+                         f"{stats['p95_ms']:>10.3f} {stats['max_ms']:>10.3f}")
+        return '\n'.join(lines)
+
+
+def _percentile(sorted_values: list[float], percent: float) -> float:
+    """Return the percent-th percentile of sorted_values, by the nearest rank method.
+
+    Preconditions:
+        - sorted_values != [] and sorted_values is sorted
+        - 0 < percent <= 100
+
+    >>> _percentile([1.0, 2.0, 3.0, 4.0], 50), _percentile([1.0, 2.0, 3.0, 4.0], 95)
+    (2.0, 4.0)
+    """
+    rank = -(-len(sorted_values) * percent // 100)  # the ceiling of len * percent / 100
+    return sorted_values[max(int(rank), 1) - 1]
+
+
+# The tracer that records the spans, or None if tracing is off
+tracer = Tracer() if ENABLED else None
+
+
+def traced(name: Optional[str] = None) -> Callable[[Callable], Callable]:
+    """Return a decorator that records a span called name, or the qualified name of the function if name is
+    None, around every call of the function it decorates. If tracing is off, the function is not changed.
+    """
+    def decorator(function: Callable) -> Callable:
+        if tracer is None:
+            return function
+        span_name = function.__qualname__ if name is None else name
+
+        @functools.wraps(function)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            start = time.perf_counter_ns()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                tracer.record(span_name, start, time.perf_counter_ns())
+
+        return wrapper
+
+    return decorator
+
+
+def span(name: str, **args: Any) -> ContextManager[None]:
+    """Return a context manager that records a span called name, described by args, around its block.
+    If tracing is off, it does nothing.
+    """
+    if tracer is None:
+        return _NO_SPAN
+    return _span(name, args)
+
+
+# The context manager returned by span when tracing is off
+_NO_SPAN = nullcontext()
+
+
+@contextmanager
+def _span(name: str, args: dict) -> Iterator[None]:
+    """Record a span called name, described by args, around the block of the with statement.
+    """
+    start = time.perf_counter_ns()
+    try:
+        yield
+    finally:
+        tracer.record(name, start, time.perf_counter_ns(), args)